@@ -0,0 +1,284 @@
+"""
+Publish Throughput Benchmark
+Seeds N due posts and publishes them end to end against the mock platform server,
+comparing the legacy sequential scheduler loop with PublishEngine
+
+Reports per run: publish throughput, p50/p99 schedule-to-publish lag of published
+posts, time spent in database statements, final post statuses and what the mock
+server served (including injected 500s and 429s). Judge publish-path changes by
+these numbers; --json keeps them for comparison between runs.
+
+Usage:
+    python benchmark_publish.py --posts 500 --latency-ms 200
+    python benchmark_publish.py --posts 2000 --latency-ms 150 --jitter-ms 300 \\
+        --error-rate 0.02 --throttle-rate 0.01 --cases engine --json results.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import httpx
+
+MOCK_PORT = int(os.getenv("BENCHMARK_MOCK_PORT", "9100"))
+MOCK_BASE = f"http://127.0.0.1:{MOCK_PORT}"
+
+# Route the publish path to the mock server before integration modules are imported
+os.environ.setdefault("LINKEDIN_API_BASE_URL", MOCK_BASE)
+os.environ.setdefault("THREADS_API_BASE_URL", f"{MOCK_BASE}/v1.0")
+os.environ.setdefault("LINKEDIN_ACCESS_TOKEN", "bench-token")
+os.environ.setdefault("LINKEDIN_PERSON_URN", "bench-person")
+os.environ.setdefault("THREADS_ACCESS_TOKEN", "bench-token")
+# Measure the pipeline, not the daily quotas; platform 429s still exercise the engine's limiter
+os.environ.setdefault("THREADS_POSTS_PER_DAY", "1000000")
+os.environ.setdefault("LINKEDIN_POSTS_PER_DAY", "1000000")
+# Short backoffs so injected failures are retried within the run
+os.environ.setdefault("RETRY_BASE_DELAY_SECONDS", "1")
+os.environ.setdefault("RETRY_MAX_DELAY_SECONDS", "10")
+os.environ.setdefault("RATE_LIMIT_DEFAULT_BACKOFF_SECONDS", "5")
+
+from sqlalchemy import event, select, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+import rate_limiter
+from database import Base, create_database_engine
+from models import SocialPost, PostStatus
+from integration_service import send_to_social
+from publisher import PublishEngine
+from http_clients import close_clients
+
+PLATFORMS = ["linkedin", "threads"]
+
+
+def start_mock_server(args) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        MOCK_LATENCY_MS=str(args.latency_ms),
+        MOCK_LATENCY_JITTER_MS=str(args.jitter_ms),
+        MOCK_ERROR_RATE=str(args.error_rate),
+        MOCK_THROTTLE_RATE=str(args.throttle_rate),
+        MOCK_RATE_LIMIT=str(args.rate_limit),
+        MOCK_RATE_LIMIT_WINDOW_SECONDS=str(args.rate_limit_window),
+    )
+    if args.seed is not None:
+        env["MOCK_SEED"] = str(args.seed)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "mock_platform_server:app",
+         "--port", str(MOCK_PORT), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+    )
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{MOCK_BASE}/health").status_code == 200:
+                return proc
+        except httpx.TransportError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("Mock platform server did not start")
+
+
+class DBTimer:
+    """Wall time and count of statements executed on an engine"""
+
+    def __init__(self, engine):
+        self.seconds = 0.0
+        self.statements = 0
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", self._before)
+        event.listen(sync_engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("bench_started", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        self.seconds += time.perf_counter() - conn.info["bench_started"].pop()
+        self.statements += 1
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for no values)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+async def seed_posts(session_factory, count: int, platforms: List[str]):
+    async with session_factory() as session:
+        session.add_all([
+            SocialPost(
+                content=f"Benchmark post {i}",
+                scheduled_at=datetime.now(timezone.utc),
+                platform=platforms[i % len(platforms)],
+                status=PostStatus.pending,
+            )
+            for i in range(count)
+        ])
+        await session.commit()
+
+
+async def legacy_loop(session_factory):
+    """
+    The pre-PublishEngine scheduler body: one post at a time, commit after each
+
+    Like the original it has no rate limiter (run_case disables it for this
+    case) and fails every post that doesn't publish on the first try.
+    """
+    async with session_factory() as session:
+        result = await session.execute(
+            select(SocialPost).where(
+                SocialPost.status == PostStatus.pending,
+                SocialPost.scheduled_at <= datetime.now(timezone.utc)
+            )
+        )
+        for post in result.scalars().all():
+            success, post_id, error_msg, *_ = await send_to_social(post.platform, post.content, post.media_url, db=session)
+            post.status = PostStatus.published if success else PostStatus.failed
+            post.error_message = error_msg
+            post.external_post_id = post_id
+            post.updated_at = datetime.now(timezone.utc)
+            await session.commit()
+
+
+async def engine_run(session_factory):
+    await PublishEngine(session_factory).publish_due()
+
+
+CASES = {"legacy": ("legacy loop", legacy_loop), "engine": ("PublishEngine", engine_run)}
+
+
+async def drain(session_factory, runner, deadline: float):
+    """Run scheduler passes until no post is pending (retries and deferrals included) or the deadline passes"""
+    while time.perf_counter() < deadline:
+        await runner(session_factory)
+        async with session_factory() as session:
+            next_due = await session.scalar(
+                select(func.min(SocialPost.scheduled_at)).where(SocialPost.status == PostStatus.pending)
+            )
+        if next_due is None:
+            return
+        wait = (next_due - datetime.now(timezone.utc)).total_seconds()
+        await asyncio.sleep(min(max(wait, 0.05), max(0.0, deadline - time.perf_counter())))
+
+
+async def run_case(key: str, args) -> Dict[str, Any]:
+    name, runner = CASES[key]
+    # Fresh limiter per case so throttling from one run doesn't carry into the next. The
+    # legacy loop predates the limiter: with it, one 429 would block the account and fail
+    # every later post, a baseline far worse than the real old loop
+    rate_limiter._rate_limiter = rate_limiter.RateLimiter(limits={}) if key == "legacy" else None
+    httpx.post(f"{MOCK_BASE}/stats/reset")
+    platforms = args.platforms.split(",")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_database_engine(f"sqlite+aiosqlite:///{tmp}/bench.db")
+        session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await seed_posts(session_factory, args.posts, platforms)
+
+        # Everything becomes due at once, so lag is measured from one instant
+        due = datetime.now(timezone.utc)
+        async with session_factory() as session:
+            await session.execute(update(SocialPost).values(scheduled_at=due, due_at=due))
+            await session.commit()
+
+        timer = DBTimer(engine)
+        started = time.perf_counter()
+        await drain(session_factory, runner, started + args.max_seconds)
+        elapsed = time.perf_counter() - started
+
+        async with session_factory() as session:
+            statuses = dict((await session.execute(
+                select(SocialPost.status, func.count()).group_by(SocialPost.status)
+            )).all())
+            published_at = (await session.scalars(
+                select(SocialPost.updated_at).where(SocialPost.status == PostStatus.published)
+            )).all()
+        await engine.dispose()
+
+    lags = [(at - due).total_seconds() for at in published_at]
+    published = len(lags)
+    result = {
+        "case": key,
+        "posts": args.posts,
+        "published": published,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": round(published / elapsed, 2) if elapsed else 0.0,
+        "lag_p50_seconds": round(percentile(lags, 50), 3),
+        "lag_p99_seconds": round(percentile(lags, 99), 3),
+        "db_seconds": round(timer.seconds, 3),
+        "db_statements": timer.statements,
+        "statuses": {getattr(status, "value", status): count for status, count in statuses.items()},
+        "mock": httpx.get(f"{MOCK_BASE}/stats").json(),
+    }
+
+    print(
+        f"{name:<14} {published:>6}/{args.posts:<6} published in {elapsed:8.2f}s  ->  "
+        f"{result['throughput_per_second']:8.1f} posts/sec | lag p50 {result['lag_p50_seconds']:.2f}s "
+        f"p99 {result['lag_p99_seconds']:.2f}s | DB {timer.seconds:.2f}s over {timer.statements} statements"
+    )
+    print(f"{'':<14} statuses: {result['statuses']}  mock: {result['mock']}")
+    return result
+
+
+async def main(args):
+    print(
+        f"Benchmark: {args.posts} due posts on {args.platforms}, mock latency {args.latency_ms}ms "
+        f"(+{args.jitter_ms}ms jitter), error rate {args.error_rate}, throttle rate {args.throttle_rate}, "
+        f"rate limit {args.rate_limit or 'off'}"
+    )
+    results = [await run_case(key, args) for key in args.cases.split(",")]
+    if len(results) == 2 and results[0]["throughput_per_second"]:
+        # Published posts per second, so a run that gives up on failed posts early doesn't look faster
+        speedup = results[1]["throughput_per_second"] / results[0]["throughput_per_second"]
+        print(
+            f"Throughput ratio ({results[1]['case']} / {results[0]['case']}): {speedup:.1f}x "
+            f"({results[1]['published']} vs {results[0]['published']} of {args.posts} published)"
+        )
+    await close_clients()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=200)
+    parser.add_argument("--platforms", default=",".join(PLATFORMS), help="Comma-separated platforms to spread posts over")
+    parser.add_argument("--cases", default="legacy,engine", help="Comma-separated runs: legacy, engine")
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Extra random latency per request, up to this much")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of platform writes answered with HTTP 500")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="Fraction of platform writes answered with HTTP 429")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Platform writes allowed per window before 429s (0 = off)")
+    parser.add_argument("--rate-limit-window", type=float, default=60)
+    parser.add_argument("--max-seconds", type=float, default=300, help="Stop waiting for retries after this long")
+    parser.add_argument("--seed", type=int, default=None, help="Seed the mock server's fault injection")
+    parser.add_argument("--json", default=None, help="Write results to this file")
+    args = parser.parse_args()
+
+    unknown = set(args.cases.split(",")) - set(CASES)
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(sorted(unknown))}")
+
+    server = start_mock_server(args)
+    try:
+        asyncio.run(main(args))
+    finally:
+        server.terminate()
+        server.wait()
@@ -0,0 +1,252 @@
+"""
+Browser Pool
+One long-lived Chromium shared by all browser automation, with a bounded set of
+warm, logged-in contexts per account that are health-checked and recycled
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Warm contexts kept per account (also the number of concurrent posts per account)
+BROWSER_CONTEXTS_PER_ACCOUNT = int(os.getenv("BROWSER_CONTEXTS_PER_ACCOUNT", "2"))
+# Recycle a context after this many posts or this long, whichever comes first
+BROWSER_CONTEXT_MAX_USES = int(os.getenv("BROWSER_CONTEXT_MAX_USES", "50"))
+BROWSER_CONTEXT_MAX_AGE_SECONDS = float(os.getenv("BROWSER_CONTEXT_MAX_AGE_SECONDS", "3600"))
+# Re-verify an idle context's login before reuse once it is this stale
+BROWSER_HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv("BROWSER_HEALTH_CHECK_INTERVAL_SECONDS", "300"))
+BROWSER_HEADLESS = os.getenv("BROWSER_HEADLESS", "true").lower() in ("1", "true", "yes")
+
+BROWSER_LAUNCH_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-blink-features=AutomationControlled'
+]
+BROWSER_VIEWPORT = {"width": 1280, "height": 720}
+
+
+class PooledContext:
+    """A browser context and its page, owned by the pool and leased to one post at a time"""
+
+    def __init__(self, account: str, context, page):
+        self.account = account
+        self.context = context
+        self.page = page
+        self.uses = 0
+        self.created_at = time.monotonic()
+        self.checked_at = self.created_at
+
+    def expired(self, max_uses: int, max_age: float) -> bool:
+        return self.uses >= max_uses or time.monotonic() - self.created_at >= max_age
+
+    async def close(self):
+        try:
+            await self.context.close()
+        except Exception as e:
+            logger.warning(f"[BROWSER POOL] Error closing context for {self.account}: {e}")
+
+
+class _AccountSlots:
+    """Idle contexts and the concurrency cap for one account"""
+
+    def __init__(self, size: int):
+        self.idle: Deque[PooledContext] = deque()
+        self.slots = asyncio.Semaphore(size)
+        self.open = 0
+
+
+class BrowserPool:
+    """Shared Chromium plus per-account pools of reusable contexts"""
+
+    def __init__(
+        self,
+        contexts_per_account: int = BROWSER_CONTEXTS_PER_ACCOUNT,
+        max_uses: int = BROWSER_CONTEXT_MAX_USES,
+        max_age: float = BROWSER_CONTEXT_MAX_AGE_SECONDS,
+        health_check_interval: float = BROWSER_HEALTH_CHECK_INTERVAL_SECONDS,
+    ):
+        self.contexts_per_account = contexts_per_account
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.health_check_interval = health_check_interval
+        self._playwright = None
+        self._browser = None
+        self._accounts: Dict[str, _AccountSlots] = {}
+        # Created lazily so the pool can be built outside a running loop
+        self._launch_lock: Optional[asyncio.Lock] = None
+
+    async def _get_browser(self):
+        """The shared browser, (re)launched if it is not running"""
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+        if self._launch_lock is None:
+            self._launch_lock = asyncio.Lock()
+        async with self._launch_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            if self._browser is not None:
+                logger.warning("[BROWSER POOL] Browser disconnected; relaunching and dropping its contexts")
+                for slots in self._accounts.values():
+                    slots.idle.clear()
+                    slots.open = 0
+            if self._playwright is None:
+                from playwright.async_api import async_playwright
+                self._playwright = await async_playwright().start()
+            logger.info("[BROWSER POOL] Launching browser...")
+            self._browser = await self._playwright.chromium.launch(
+                headless=BROWSER_HEADLESS, args=BROWSER_LAUNCH_ARGS
+            )
+            return self._browser
+
+    def _slots(self, account: str) -> _AccountSlots:
+        slots = self._accounts.get(account)
+        if slots is None:
+            slots = _AccountSlots(self.contexts_per_account)
+            self._accounts[account] = slots
+        return slots
+
+    async def _open(self, account: str, storage_state: Optional[dict]) -> PooledContext:
+        browser = await self._get_browser()
+        context = await browser.new_context(storage_state=storage_state, viewport=BROWSER_VIEWPORT)
+        page = await context.new_page()
+        self._slots(account).open += 1
+        logger.info(f"[BROWSER POOL] Opened context for {account}")
+        return PooledContext(account, context, page)
+
+    async def _discard(self, entry: PooledContext):
+        slots = self._slots(entry.account)
+        slots.open = max(0, slots.open - 1)
+        await entry.close()
+
+    async def _take_idle(
+        self,
+        slots: _AccountSlots,
+        health_check: Optional[Callable[[PooledContext], Awaitable[bool]]],
+    ) -> Optional[PooledContext]:
+        """Pop a usable idle context, closing any that are worn out, orphaned or logged out"""
+        while slots.idle:
+            entry = slots.idle.popleft()
+            if self._browser is None or not self._browser.is_connected():
+                await self._discard(entry)
+                continue
+            if entry.expired(self.max_uses, self.max_age):
+                logger.info(f"[BROWSER POOL] Recycling context for {entry.account} after {entry.uses} uses")
+                await self._discard(entry)
+                continue
+            if health_check is not None and time.monotonic() - entry.checked_at >= self.health_check_interval:
+                try:
+                    healthy = await health_check(entry)
+                except Exception as e:
+                    logger.warning(f"[BROWSER POOL] Health check errored for {entry.account}: {e}")
+                    healthy = False
+                if not healthy:
+                    logger.warning(f"[BROWSER POOL] Context for {entry.account} failed its health check; replacing it")
+                    await self._discard(entry)
+                    continue
+                entry.checked_at = time.monotonic()
+            return entry
+        return None
+
+    @asynccontextmanager
+    async def lease(
+        self,
+        account: str,
+        storage_state: Optional[dict] = None,
+        prepare: Optional[Callable[[PooledContext], Awaitable[None]]] = None,
+        health_check: Optional[Callable[[PooledContext], Awaitable[bool]]] = None,
+    ) -> AsyncIterator[PooledContext]:
+        """
+        Borrow a warm context for `account`, waiting if all of its contexts are busy
+
+        A context that raised while leased is closed rather than returned,
+        since its page may be in any state.
+
+        Args:
+            account: Pool key (e.g. the platform username)
+            storage_state: Saved cookies/localStorage for a newly opened context
+            prepare: Awaited once on a newly opened context (e.g. log in)
+            health_check: Awaited on an idle context at most every
+                health_check_interval seconds; False replaces the context
+        """
+        slots = self._slots(account)
+        async with slots.slots:
+            entry = await self._take_idle(slots, health_check)
+            if entry is None:
+                entry = await self._open(account, storage_state)
+                try:
+                    if prepare is not None:
+                        await prepare(entry)
+                except BaseException:
+                    await self._discard(entry)
+                    raise
+                entry.checked_at = time.monotonic()
+
+            try:
+                yield entry
+            except BaseException:
+                await self._discard(entry)
+                raise
+            entry.uses += 1
+            if entry.expired(self.max_uses, self.max_age):
+                await self._discard(entry)
+            else:
+                slots.idle.append(entry)
+
+    @asynccontextmanager
+    async def isolated_context(self) -> AsyncIterator[Any]:
+        """A throwaway context on the shared browser (e.g. to verify credentials), closed afterwards"""
+        browser = await self._get_browser()
+        context = await browser.new_context(viewport=BROWSER_VIEWPORT)
+        try:
+            yield context
+        finally:
+            await context.close()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Open and idle context counts per account"""
+        return [
+            {"account": account, "open": slots.open, "idle": len(slots.idle)}
+            for account, slots in sorted(self._accounts.items())
+        ]
+
+    async def close(self):
+        """Close every context, the browser and Playwright"""
+        for slots in self._accounts.values():
+            while slots.idle:
+                await slots.idle.popleft().close()
+            slots.open = 0
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception as e:
+                logger.warning(f"[BROWSER POOL] Error closing browser: {e}")
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+# Global instance
+_browser_pool: Optional[BrowserPool] = None
+
+def get_browser_pool() -> BrowserPool:
+    """Get or create the global browser pool (the browser itself launches on first lease)"""
+    global _browser_pool
+    if _browser_pool is None:
+        _browser_pool = BrowserPool()
+    return _browser_pool
+
+
+async def close_browser_pool():
+    """Shut the global pool down if it was ever used (called on shutdown)"""
+    global _browser_pool
+    if _browser_pool is not None:
+        await _browser_pool.close()
+        _browser_pool = None
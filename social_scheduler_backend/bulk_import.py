@@ -0,0 +1,222 @@
+"""
+Bulk Post Import
+Validation and streaming record parsing (JSON array, NDJSON, CSV) for bulk post ingest
+"""
+
+import asyncio
+import codecs
+import csv
+import io
+import json
+import pickle
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from models import PostStatus
+from platform_adapters import get_adapter
+from schemas import PostCreate
+
+CSV_COLUMNS = ("content", "platform", "scheduled_at", "media_url", "account_id")
+
+
+class RecordError(ValueError):
+    """A single input record that could not be parsed or validated"""
+
+
+class BodyTooLarge(ValueError):
+    """A buffered request body went over its size cap"""
+
+
+def normalize_post(post_data: PostCreate) -> Dict[str, Any]:
+    """
+    Validate a post and turn it into SocialPost column values
+
+    Raises:
+        RecordError: the platform's adapter rejects the post (character limit,
+            carousel/thread fields the platform doesn't support)
+    """
+    media_urls = post_data.media_urls or None
+    thread_parts = post_data.thread_parts or None
+    problem = get_adapter(post_data.platform).validate(
+        post_data.content, post_data.media_url, media_urls, thread_parts
+    )
+    if problem:
+        raise RecordError(problem)
+
+    # Ensure scheduled_at is UTC; naive times are treated as UTC
+    scheduled_time = post_data.scheduled_at or datetime.now(timezone.utc)
+    if scheduled_time.tzinfo is None:
+        scheduled_time = scheduled_time.replace(tzinfo=timezone.utc)
+    else:
+        scheduled_time = scheduled_time.astimezone(timezone.utc)
+
+    return {
+        "content": post_data.content,
+        "media_url": post_data.media_url,
+        "media_urls": media_urls,
+        "thread_parts": thread_parts,
+        "scheduled_at": scheduled_time,
+        "platform": post_data.platform,
+        "account_id": post_data.account_id,
+        "status": PostStatus.pending,
+        "updated_at": datetime.now(timezone.utc),
+    }
+
+
+def check_account(values: Dict[str, Any], accounts: Dict[int, str]):
+    """
+    Check that a post's account_id names an active account on the post's platform
+
+    Args:
+        values: Column values from normalize_post
+        accounts: Active account id -> platform
+
+    Raises:
+        RecordError: unknown, disconnected or other-platform account, or a
+            platform whose adapter can't publish as a connected account
+    """
+    account_id = values.get("account_id")
+    if account_id is None:
+        return
+    if not get_adapter(values["platform"]).supports_accounts:
+        raise RecordError(f"{values['platform'].capitalize()} posts can't be bound to a connected account yet.")
+    platform = accounts.get(account_id)
+    if platform is None:
+        raise RecordError(f"Account {account_id} is not connected.")
+    if platform != values["platform"]:
+        raise RecordError(f"Account {account_id} is a {platform.capitalize()} account, not {values['platform'].capitalize()}.")
+
+
+def validate_record(record: Any) -> Dict[str, Any]:
+    """Parse a raw record (dict) into SocialPost column values or raise RecordError"""
+    if not isinstance(record, dict):
+        raise RecordError("Expected an object")
+    try:
+        post_data = PostCreate(**record)
+    except ValidationError as e:
+        raise RecordError("; ".join(
+            f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+        ))
+    return normalize_post(post_data)
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a byte stream into lines without buffering more than one line"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (row number, record or RecordError) for each non-blank NDJSON line"""
+    row = 0
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            yield row, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row, RecordError(f"Invalid JSON: {e.msg}")
+
+
+async def iter_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (row number, record or RecordError) for each CSV data row; the first row is the header"""
+    header = None
+    pending = ""
+    row = 0
+    async for line in iter_lines(chunks):
+        # A quoted field may span lines: keep reading until the quotes balance
+        pending = f"{pending}\n{line}" if pending else line
+        if pending.count('"') % 2:
+            continue
+        record_text, pending = pending, ""
+        if not record_text.strip():
+            continue
+        values = next(csv.reader(io.StringIO(record_text)))
+        if header is None:
+            header = [h.strip().lower() for h in values]
+            missing = {"content", "platform"} - set(header)
+            if missing:
+                raise RecordError(f"CSV header is missing: {', '.join(sorted(missing))}")
+            continue
+        row += 1
+        if len(values) != len(header):
+            yield row, RecordError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        yield row, {k: (v if v != "" else None) for k, v in zip(header, values) if k in CSV_COLUMNS}
+    if pending:
+        row += 1
+        yield row, RecordError("Unterminated quoted field")
+
+
+async def iter_json_array(body: bytes) -> AsyncIterator[Tuple[int, Any]]:
+    """Yield (row number, record) for a JSON array body (not streamed; the array is parsed whole)"""
+    try:
+        records = json.loads(body)
+    except json.JSONDecodeError as e:
+        raise RecordError(f"Invalid JSON: {e.msg}")
+    if not isinstance(records, list):
+        records = [records]
+    for row, record in enumerate(records, start=1):
+        yield row, record
+
+
+async def read_body(chunks: AsyncIterator[bytes], max_bytes: int) -> bytes:
+    """
+    Collect a request body that has to be parsed whole, refusing to buffer more than `max_bytes`
+
+    Raises:
+        BodyTooLarge: the body is bigger than `max_bytes`
+    """
+    body = bytearray()
+    async for chunk in chunks:
+        body.extend(chunk)
+        if len(body) > max_bytes:
+            raise BodyTooLarge(f"Body exceeds {max_bytes} bytes; send NDJSON or CSV for large imports")
+    return bytes(body)
+
+
+class RowSpool:
+    """
+    Validated rows parked in a temporary file, chunk by chunk
+
+    Lets an import validate a whole upload before opening its write transaction,
+    without holding every row in memory.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self.count = 0
+
+    async def write(self, rows: List[Dict[str, Any]]):
+        await asyncio.to_thread(pickle.dump, rows, self._file, pickle.HIGHEST_PROTOCOL)
+        self.count += len(rows)
+
+    def _read(self) -> Optional[List[Dict[str, Any]]]:
+        try:
+            return pickle.load(self._file)
+        except EOFError:
+            return None
+
+    async def chunks(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield the written chunks in order"""
+        await asyncio.to_thread(self._file.seek, 0)
+        while True:
+            rows = await asyncio.to_thread(self._read)
+            if rows is None:
+                return
+            yield rows
+
+    def close(self):
+        self._file.close()
@@ -1,13 +1,58 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 import os
 
-DATABASE_URL = "sqlite+aiosqlite:////app/social_posts.db"
+
+def normalize_database_url(url: str) -> str:
+    """Map plain postgres URLs (as handed out by most hosts) onto the asyncpg driver"""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+# SQLite (single host, single writer) by default; set DATABASE_URL for PostgreSQL
+DATABASE_URL = normalize_database_url(os.getenv("DATABASE_URL", "sqlite+aiosqlite:////app/social_posts.db"))
+DB_BACKEND = make_url(DATABASE_URL).get_backend_name()  # "sqlite" or "postgresql"
+
+# SQLite profile: "production" (WAL + tuned pragmas) or "development" (SQLite defaults)
+DB_PROFILE = os.getenv("DB_PROFILE", "production").strip().lower()
+# SQL echo is synchronous logging on the event loop; keep it off unless debugging
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+SQLITE_PRAGMAS = {
+    "production": {
+        # Readers no longer block on the scheduler's commits (and vice versa)
+        "journal_mode": "WAL",
+        # Durable across application crashes; only an OS crash can lose the last commits
+        "synchronous": "NORMAL",
+        # Negative = KiB of page cache per connection
+        "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "temp_store": "MEMORY",
+        "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    },
+    "development": {
+        "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    },
+}
+
+# PostgreSQL pool tuning
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# asyncpg prepared statement cache per connection; set 0 behind PgBouncer in transaction mode
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
 
 # Ensure database directory exists
-db_path = "/app/social_posts.db"
-db_dir = os.path.dirname(db_path)
+db_path = make_url(DATABASE_URL).database if DB_BACKEND == "sqlite" else None
+db_dir = os.path.dirname(db_path) if db_path and db_path != ":memory:" else None
 if db_dir and not os.path.exists(db_dir):
     try:
         os.makedirs(db_dir, exist_ok=True)
@@ -15,11 +60,49 @@ if db_dir and not os.path.exists(db_dir):
     except Exception as e:
         print(f"Error creating database directory: {e}")
 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=True,
-    connect_args={"check_same_thread": False}
-)
+
+def create_database_engine(url: str = DATABASE_URL, profile: str = DB_PROFILE, echo: bool = DB_ECHO):
+    """Create the async engine for `url`: tuned pool for PostgreSQL, profile pragmas for SQLite"""
+    url = normalize_database_url(url)
+    if make_url(url).get_backend_name() == "postgresql":
+        return create_async_engine(
+            url,
+            echo=echo,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            # Detect connections dropped by failovers or idle timeouts before using them
+            pool_pre_ping=True,
+            connect_args={
+                "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+                "server_settings": {"application_name": "social_scheduler"},
+            },
+        )
+
+    pragmas = SQLITE_PRAGMAS.get(profile, SQLITE_PRAGMAS["production"])
+    db_engine = create_async_engine(
+        url,
+        echo=echo,
+        connect_args={
+            "check_same_thread": False,
+            "timeout": pragmas.get("busy_timeout", SQLITE_BUSY_TIMEOUT_MS) / 1000,
+        }
+    )
+
+    @event.listens_for(db_engine.sync_engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return db_engine
+
+
+engine = create_database_engine()
 
 AsyncSessionLocal = sessionmaker(
     bind=engine,
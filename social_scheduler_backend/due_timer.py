@@ -0,0 +1,151 @@
+"""
+Due Timer
+In-process min-heap of upcoming scheduled_at values that sleeps until the next post is due
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from models import SocialPost, PostStatus
+
+logger = logging.getLogger(__name__)
+
+# Safety-net reconciliation: how often, how far ahead, and how many rows per scan
+DUE_TIMER_RECONCILE_SECONDS = int(os.getenv("DUE_TIMER_RECONCILE_SECONDS", "60"))
+DUE_TIMER_HORIZON_SECONDS = int(os.getenv("DUE_TIMER_HORIZON_SECONDS", "3600"))
+DUE_TIMER_RECONCILE_LIMIT = int(os.getenv("DUE_TIMER_RECONCILE_LIMIT", "10000"))
+
+# Upper bound on a single sleep so wall-clock jumps are noticed
+MAX_SLEEP_SECONDS = 60
+
+
+class DueTimer:
+    """Wakes the publisher exactly when the earliest known post becomes due"""
+
+    def __init__(self, on_due: Callable[[], Awaitable[object]], session_factory):
+        """
+        Initialize the timer
+
+        Args:
+            on_due: Coroutine run whenever at least one post is due (claims and publishes)
+            session_factory: Callable returning an AsyncSession, used by reconcile()
+        """
+        self.on_due = on_due
+        self.session_factory = session_factory
+        self._heap: List[Tuple[datetime, int]] = []
+        # post_id -> due time; heap entries that disagree are stale and skipped
+        self._entries: Dict[int, datetime] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def schedule(self, post_id: int, when: datetime):
+        """Add or move a post; wakes the loop if it is now the earliest"""
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        self._entries[post_id] = when
+        heapq.heappush(self._heap, (when, post_id))
+        if self._wakeup is not None and self._heap[0] == (when, post_id):
+            self._wakeup.set()
+
+    def discard(self, post_id: int):
+        """Forget a post (deleted or no longer pending)"""
+        self._entries.pop(post_id, None)
+
+    def next_due(self) -> Optional[datetime]:
+        """Earliest live due time, dropping stale heap entries"""
+        while self._heap:
+            when, post_id = self._heap[0]
+            if self._entries.get(post_id) == when:
+                return when
+            heapq.heappop(self._heap)
+        return None
+
+    def _pop_due(self, now: datetime) -> int:
+        """Remove every entry due at or before `now`; returns how many were live"""
+        fired = 0
+        while self._heap and self._heap[0][0] <= now:
+            when, post_id = heapq.heappop(self._heap)
+            if self._entries.get(post_id) == when:
+                del self._entries[post_id]
+                fired += 1
+        return fired
+
+    async def reconcile(self) -> int:
+        """
+        Load pending posts due within the horizon into the heap
+
+        Catches posts created by other workers, leases that lapsed and
+        anything this process missed. Returns the number of posts loaded.
+        """
+        horizon = datetime.now(timezone.utc) + timedelta(seconds=DUE_TIMER_HORIZON_SECONDS)
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(SocialPost.id, SocialPost.scheduled_at)
+                .where(
+                    SocialPost.status == PostStatus.pending,
+                    SocialPost.scheduled_at <= horizon
+                )
+                .order_by(SocialPost.scheduled_at)
+                .limit(DUE_TIMER_RECONCILE_LIMIT)
+            )
+            rows = result.all()
+
+        for post_id, scheduled_at in rows:
+            if scheduled_at.tzinfo is None:
+                scheduled_at = scheduled_at.replace(tzinfo=timezone.utc)
+            if self._entries.get(post_id) != scheduled_at:
+                self.schedule(post_id, scheduled_at)
+        return len(rows)
+
+    async def start(self):
+        """Start the timer loop on the running event loop"""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("[DUE TIMER] Started.")
+
+    async def stop(self):
+        """Stop the timer loop"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("[DUE TIMER] Stopped.")
+
+    async def _run(self):
+        while True:
+            next_due = self.next_due()
+            now = datetime.now(timezone.utc)
+
+            if next_due is None or next_due > now:
+                timeout = MAX_SLEEP_SECONDS
+                if next_due is not None:
+                    timeout = min(timeout, (next_due - now).total_seconds())
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            fired = self._pop_due(now)
+            if not fired:
+                continue
+            try:
+                await self.on_due()
+            except Exception as e:
+                logger.error(f"[DUE TIMER] Error running due posts: {e}")
@@ -0,0 +1,69 @@
+"""
+Shared HTTP Clients
+One long-lived, pooled httpx.AsyncClient per platform, opened in lifespan and closed on shutdown
+"""
+
+import logging
+import os
+from typing import Dict, Iterable
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Pool tuning (overridable via environment)
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "60"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Platforms whose APIs negotiate HTTP/2
+HTTP2_PLATFORMS = {"threads", "linkedin"}
+
+PLATFORMS = ("threads", "linkedin")
+
+try:
+    import h2  # noqa: F401  (httpx[http2] extra)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _build_client(platform: str) -> httpx.AsyncClient:
+    http2 = HTTP2_ENABLED and HTTP2_AVAILABLE and platform in HTTP2_PLATFORMS
+    limits = httpx.Limits(
+        max_connections=HTTP_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    logger.info(f"[HTTP] Opening {platform} pool (http2={http2}, max={HTTP_POOL_MAX_CONNECTIONS})")
+    # No auth headers here: callers pass per-request credentials
+    return httpx.AsyncClient(limits=limits, timeout=HTTP_TIMEOUT_SECONDS, http2=http2)
+
+
+def get_client(platform: str) -> httpx.AsyncClient:
+    """Get the shared client for a platform, creating it on first use"""
+    client = _clients.get(platform)
+    if client is None or client.is_closed:
+        client = _build_client(platform)
+        _clients[platform] = client
+    return client
+
+
+async def start_clients(platforms: Iterable[str] = PLATFORMS):
+    """Open the platform pools up front (called from lifespan)"""
+    for platform in platforms:
+        get_client(platform)
+
+
+async def close_clients():
+    """Close every pool (called on shutdown)"""
+    for platform, client in list(_clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.error(f"[HTTP] Error closing {platform} pool: {e}")
+    _clients.clear()
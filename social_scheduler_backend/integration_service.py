@@ -1,10 +1,12 @@
-import asyncio
-import os
-import httpx
 import logging
-from datetime import datetime
+import time
 from dotenv import load_dotenv
-from typing import Optional, Union, Tuple, List
+from typing import Optional, List, Union
+
+from platform_adapters import (
+    PublishResult, PublishCheckpoint, PublishRequest, LeaseLost, get_adapter,
+)
+from metrics import record_publish
 
 # Configure logger
 logging.basicConfig(level=logging.INFO)
@@ -13,139 +15,58 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-async def send_to_social(platform: str, content: str, media_url: Optional[str] = None, db=None) -> Tuple[bool, Optional[str], Optional[str]]:
+
+async def send_to_social(
+    platform: str,
+    content: str,
+    media_url: Optional[str] = None,
+    db=None,
+    checkpoint: Optional[PublishCheckpoint] = None,
+    media_urls: Optional[List[str]] = None,
+    thread_parts: Optional[List[str]] = None,
+    account_id: Optional[int] = None,
+) -> PublishResult:
     """
-    Sends content to social media platforms.
-    Returns: (success, post_id, error_message)
+    Sends content to social media platforms, through the platform's adapter.
+    Resumes from `checkpoint` after an interrupted attempt so a post is never published twice.
+    Threads also takes a carousel (`media_urls`) and follow-up replies (`thread_parts`),
+    and publishes as the ConnectedAccount `account_id` (default: the oldest active account).
+    Returns: PublishResult (success, post_id, error, status_code, retry_after)
     """
     logger.info(f"[{platform.upper()}] Preparing to send: {content[:30]}...")
+    request = PublishRequest(content, media_url, media_urls, thread_parts, account_id, checkpoint)
+    started = time.perf_counter()
+    try:
+        result = await get_adapter(platform).publish(request, db=db)
+    except LeaseLost:
+        record_publish(platform, time.perf_counter() - started, error_class="lease_lost")
+        raise
+    except Exception:
+        record_publish(platform, time.perf_counter() - started, error_class="exception")
+        raise
+    record_publish(platform, time.perf_counter() - started, result)
+    return result
 
-    # --- LinkedIn Integration ---
-    if platform == 'linkedin':
-        token = os.getenv('LINKEDIN_ACCESS_TOKEN')
-        person_urn = os.getenv('LINKEDIN_PERSON_URN')
-        
-        if not token or not person_urn:
-            msg = "Missing credentials. LinkedIN Token or Person URN not set."
-            logger.error(f"[{platform.upper()}] ERROR: {msg}")
-            return False, None, msg
-
-        url = 'https://api.linkedin.com/v2/ugcPosts'
-        headers = {
-            'Authorization': f'Bearer {token}',
-            'Content-Type': 'application/json',
-            'X-Restli-Protocol-Version': '2.0.0'
-        }
-        
-        # Construct simplified text-only payload for MVP
-        payload = {
-            "author": f"urn:li:person:{person_urn}",
-            "lifecycleState": "PUBLISHED",
-            "specificContent": {
-                "com.linkedin.ugc.ShareContent": {
-                    "shareCommentary": {
-                        "text": content
-                    },
-                    "shareMediaCategory": "NONE"
-                }
-            },
-            "visibility": {
-                "com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"
-            }
-        }
-
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(url, json=payload, headers=headers)
-                if response.status_code in [201, 200]:
-                    post_id = response.json().get('id')
-                    logger.info(f"[{platform.upper()}] SUCCESS: Posted to LinkedIn. ID: {post_id}")
-                    return True, post_id, None
-                else:
-                    logger.error(f"[{platform.upper()}] FAILED: {response.text}")
-                    return False, None, response.text
-            except Exception as e:
-                logger.error(f"[{platform.upper()}] ERROR: {e}")
-                return False, None, str(e)
-
-    # --- Threads Integration (Official API with OAuth) ---
-    elif platform == 'threads':
-        from threads_api_service import ThreadsAPIService
-        from encryption import get_encryptor
-        from sqlalchemy import select
-        from models import ConnectedAccount
-        from datetime import datetime
-        
-        access_token = None
-        username = None
-
-        # 1. Try Database First (Priority)
-        if db:
-            try:
-                result = await db.execute(
-                    select(ConnectedAccount).where(
-                        ConnectedAccount.platform == 'threads',
-                        ConnectedAccount.is_active == True
-                    )
-                )
-                account = result.scalar_one_or_none()
-                
-                if account and account.access_token:
-                    encryptor = get_encryptor()
-                    access_token = encryptor.decrypt(account.access_token)
-                    username = account.username
-                    logger.info(f"[{platform.upper()}] Using connected account from DB: @{username}")
-            except Exception as e:
-                logger.error(f"[{platform.upper()}] Error decrypting DB token: {e}")
 
-        # 2. Fallback to Environment Variable
-        if not access_token and os.getenv("THREADS_ACCESS_TOKEN"):
-            access_token = os.getenv("THREADS_ACCESS_TOKEN")
-            username = os.getenv("THREADS_USERNAME", "env_user")
-            logger.info(f"[{platform.upper()}] Using token from Environment Variables (Fallback) for @{username}")
-
-        if not access_token:
-            msg = "No access token found (checked Env Var & DB)"
-            logger.error(f"[{platform.upper()}] ERROR: {msg}")
-            return False, None, msg
-            
-        try:
-            # Initialize API service
-            logger.info(f"[{platform.upper()}] Using connected account: @{username}")
-            
-            # Initialize API service
-            api = ThreadsAPIService(access_token)
-            
-            # Determine media type
-            media_type = "TEXT"
-            if media_url:
-                media_type = "IMAGE"  # Could add logic for VIDEO detection
-            
-            # Create post via API
-            result = await api.create_post(content, media_url, media_type)
-            
-            if result["success"]:
-                post_id = result.get('post_id')
-                logger.info(f"[{platform.upper()}] ✓ Successfully posted! ID: {post_id}")
-                
-                # Update last_used_at ONLY if account exists in DB
-                if account:
-                    account.last_used_at = datetime.utcnow()
-                    await db.commit()
-                
-                return True, post_id, None
-            else:
-                error_msg = result.get('error')
-                logger.error(f"[{platform.upper()}] ✗ Failed to post: {error_msg}")
-                return False, None, error_msg
-                
-        except Exception as e:
-            logger.error(f"[{platform.upper()}] ERROR: {e}")
-            return False, None, str(e)
-
-
-    # --- Generic/Mock for Others (Twitter/X, Facebook) ---
-    else:
-        logger.info(f"[{platform.upper()}] Simulation Mode (Real API not configured for this demo).")
-        await asyncio.sleep(1)
-        return True, "mock_id_123", None
+async def send_batch_to_social(
+    platform: str,
+    requests: List[PublishRequest],
+    session_factory=None,
+) -> List[Union[PublishResult, Exception]]:
+    """
+    Sends several posts to one platform in a single call to its adapter's publish_batch.
+    Each post is timed at the batch's duration in the publish metrics.
+    Returns: one PublishResult per request, in order, or the exception its publish raised
+    """
+    logger.info(f"[{platform.upper()}] Preparing to send a batch of {len(requests)} post(s)...")
+    started = time.perf_counter()
+    results = await get_adapter(platform).publish_batch(requests, session_factory=session_factory)
+    elapsed = time.perf_counter() - started
+    for result in results:
+        if isinstance(result, LeaseLost):
+            record_publish(platform, elapsed, error_class="lease_lost")
+        elif isinstance(result, BaseException):
+            record_publish(platform, elapsed, error_class="exception")
+        else:
+            record_publish(platform, elapsed, result)
+    return results
@@ -4,7 +4,10 @@
 
 # --- Standard Library Imports ---
 import os
+import time
 import json
+import base64
+import hashlib
 import logging
 import urllib.parse
 from contextlib import asynccontextmanager
@@ -12,32 +15,50 @@ from datetime import datetime, timezone, timedelta
 from typing import List, Union, Optional, Tuple
 
 # --- Third-Party Imports ---
-import httpx
-from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, Query
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy import tuple_, func, delete, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
 # --- Local Imports ---
-from database import engine, Base, get_db, AsyncSessionLocal
-from models import SocialPost, PostStatus, ConnectedAccount
+from database import engine, get_db, AsyncSessionLocal
+from migrations import run_migrations, pending_migrations, RUN_MIGRATIONS_ON_STARTUP
+from models import SocialPost, PostStatus, ConnectedAccount, PostTombstone
 from schemas import (
     PostCreate,
     PostResponse,
+    PostListItem,
+    PostsDelta,
     ConnectAccountRequest,
     ConnectAccountResponse,
     AccountsStatusResponse,
+    RateLimitsResponse,
+    PlatformCapabilities,
     AccountStatus,
     DisconnectAccountResponse
 )
-from integration_service import send_to_social
 from encryption import get_encryptor
+from token_cache import get_token_cache
+from rate_limiter import get_rate_limiter
+from platform_adapters import load_adapters, list_adapters
+from post_events import get_broadcaster
+from bulk_import import (
+    RecordError, BodyTooLarge, RowSpool, normalize_post, validate_record, check_account,
+    iter_ndjson, iter_csv, iter_json_array, read_body,
+)
+from publisher import PublishEngine
+from due_timer import DueTimer, DUE_TIMER_RECONCILE_SECONDS, DUE_TIMER_HORIZON_SECONDS
+from http_clients import start_clients, close_clients, get_client
+from browser_pool import close_browser_pool
+from session_store import get_session_store
+from metrics import SCHEDULER_TICK_SECONDS, HTTP_REQUEST_SECONDS, timed, instrument_engine, render_metrics
 
 # --- Logging ---
 logging.basicConfig(level=logging.INFO)
@@ -57,50 +78,33 @@ THREADS_REDIRECT_URI = os.getenv(
 # ============================================================
 
 async def check_scheduled_posts():
-    """Checks the database for posts that are 'pending' and scheduled_at <= now."""
+    """Claims posts that are 'pending' and scheduled_at <= now, then publishes them."""
+    try:
+        # Leases keep concurrent workers/replicas from publishing the same post twice
+        with timed(SCHEDULER_TICK_SECONDS):
+            await publish_engine.publish_due()
+    except Exception as e:
+        logger.error(f"[SCHEDULER] Error details: {e}")
+
+
+async def reconcile_due_posts():
+    """Safety net: reload upcoming posts into the due timer (other workers, lapsed leases)."""
+    try:
+        loaded = await due_timer.reconcile()
+        logger.debug(f"[SCHEDULER] Reconciled {loaded} upcoming posts.")
+    except Exception as e:
+        logger.error(f"[SCHEDULER] Reconciliation failed: {e}")
+
+
+async def prune_post_tombstones():
+    """Drop delete markers older than the incremental-sync retention window."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=POST_TOMBSTONE_RETENTION_DAYS)
     async with AsyncSessionLocal() as session:
         try:
-            # Use UTC for all time comparisons
-            now = datetime.now(timezone.utc)
-            
-            result = await session.execute(
-                select(SocialPost).where(
-                    SocialPost.status == "pending",
-                    SocialPost.scheduled_at <= now
-                )
-            )
-            posts_to_publish = result.scalars().all()
-            
-            if posts_to_publish:
-                logger.info(f"[SCHEDULER] Checked at {now}. Found {len(posts_to_publish)} pending posts due.")
-
-            for post in posts_to_publish:
-                try:
-                    # Pass session to allow token retrieval from DB
-                    success, post_id, error_msg = await send_to_social(post.platform, post.content, post.media_url, db=session)
-                    
-                    if success:
-                        post.status = PostStatus.published
-                        post.external_post_id = post_id
-                        logger.info(f"[SCHEDULER] Post {post.id} -> PUBLISHED. ID: {post_id}")
-                    else:
-                        # Save error message to status column for dashboard visibility
-                        error_preview = error_msg[:250] if error_msg else "Unknown Error"
-                        post.status = f"failed: {error_preview}"
-                        logger.error(f"[SCHEDULER] Post {post.id} -> FAILED. Error: {error_msg}")
-
-                    post.updated_at = datetime.now(timezone.utc)
-                    # Force commit immediately to persist status
-                    await session.commit()
-                    
-                except Exception as e:
-                    logger.error(f"[SCHEDULER] Error publishing post {post.id}: {e}")
-                    post.status = PostStatus.failed
-                    # Force commit on exception to save failed state
-                    await session.commit()
-            
+            await session.execute(delete(PostTombstone).where(PostTombstone.deleted_at < cutoff))
+            await session.commit()
         except Exception as e:
-            logger.error(f"[SCHEDULER] Error details: {e}")
+            logger.error(f"[SCHEDULER] Tombstone pruning failed: {e}")
             await session.rollback()
 
 
@@ -109,14 +113,24 @@ async def check_scheduled_posts():
 # ============================================================
 
 scheduler = AsyncIOScheduler()
+# Posts deferred by rate limits or queued for retry go back on the due timer at their new time
+publish_engine = PublishEngine(AsyncSessionLocal, on_reschedule=lambda post_id, when: due_timer.schedule(post_id, when))
+due_timer = DueTimer(check_scheduled_posts, AsyncSessionLocal)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Statement timings for /metrics
+    instrument_engine(engine)
+
     try:
-        # Create DB tables
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-        logger.info("[STARTUP] Database tables created/verified.")
+        # Versioned schema migrations (run once across workers; no-op when current)
+        if RUN_MIGRATIONS_ON_STARTUP:
+            applied = await run_migrations(engine)
+            logger.info(f"[STARTUP] Database schema up to date ({applied} migration(s) applied).")
+        else:
+            pending = await pending_migrations(engine)
+            if pending:
+                logger.warning(f"[STARTUP] {len(pending)} pending migration(s); run `python migrations.py`.")
     except Exception as e:
         logger.error(f"[STARTUP] CRITICAL: Database init failed: {e}")
         raise
@@ -133,9 +147,9 @@ async def lifespan(app: FastAPI):
         if env_token:
             async with AsyncSessionLocal() as db:
                 result = await db.execute(
-                    select(ConnectedAccount).where(ConnectedAccount.platform == 'threads')
+                    select(ConnectedAccount.id).where(ConnectedAccount.platform == 'threads').limit(1)
                 )
-                existing = result.scalar_one_or_none()
+                existing = result.scalar()
                 
                 if not existing:
                     logger.info("[STARTUP] Syncing Threads Token from Env to DB...")
@@ -152,11 +166,20 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"[STARTUP] Error syncing env token: {e}")
 
-    # Start Scheduler
+    # Platform adapters are registered once; publishing and validation look them up
+    load_adapters()
+
+    # Open shared, pooled HTTP clients for platform APIs
+    await start_clients()
+
+    # Start Scheduler: the due timer fires on exact scheduled_at, the interval job only reconciles
     try:
-        scheduler.add_job(check_scheduled_posts, IntervalTrigger(seconds=10))
+        await due_timer.start()
+        await reconcile_due_posts()
+        scheduler.add_job(reconcile_due_posts, IntervalTrigger(seconds=DUE_TIMER_RECONCILE_SECONDS))
+        scheduler.add_job(prune_post_tombstones, IntervalTrigger(hours=1))
         scheduler.start()
-        logger.info("[SCHEDULER] Started background job (check every 10s).")
+        logger.info(f"[SCHEDULER] Started due timer (reconcile every {DUE_TIMER_RECONCILE_SECONDS}s).")
     except Exception as e:
         logger.error(f"[STARTUP] CRITICAL: Scheduler failed to start: {e}")
         raise
@@ -164,7 +187,10 @@ async def lifespan(app: FastAPI):
     yield
 
     scheduler.shutdown()
+    await due_timer.stop()
     logger.info("[SCHEDULER] Shut down.")
+    await close_clients()
+    await close_browser_pool()
 
 
 # ============================================================
@@ -179,8 +205,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Sync-Cursor", "ETag"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Time every request, labelled by route template so path parameters don't multiply series."""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.labels(
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        ).observe(time.perf_counter() - started)
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Log validation errors for debugging 422 responses."""
@@ -233,6 +277,7 @@ async def get_accounts_status(db: AsyncSession = Depends(get_db)):
         return AccountsStatusResponse(
             accounts=[
                 AccountStatus(
+                    id=acc.id,
                     platform=acc.platform,
                     username=acc.username,
                     connected_at=acc.connected_at.isoformat(),
@@ -246,20 +291,35 @@ async def get_accounts_status(db: AsyncSession = Depends(get_db)):
         return AccountsStatusResponse(accounts=[])
 
 
+@app.get("/api/platforms", response_model=List[PlatformCapabilities])
+async def get_platforms():
+    """Character limits, carousel/thread support and publish quotas per platform."""
+    return [adapter.capabilities() for adapter in list_adapters()]
+
+
+@app.get("/api/rate-limits", response_model=RateLimitsResponse)
+async def get_rate_limits():
+    """Current publish quota per (platform, account) bucket."""
+    return RateLimitsResponse(buckets=get_rate_limiter().snapshot())
+
+
 @app.delete("/api/accounts/disconnect/{platform}")
-async def disconnect_account(platform: str, db: AsyncSession = Depends(get_db)):
-    """Disconnect a platform account."""
+async def disconnect_account(platform: str, account_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    """Disconnect one account (`account_id`) or every account of a platform."""
     try:
-        result = await db.execute(
-            select(ConnectedAccount).where(
-                ConnectedAccount.platform == platform,
-                ConnectedAccount.is_active == True
-            )
+        query = select(ConnectedAccount).where(
+            ConnectedAccount.platform == platform,
+            ConnectedAccount.is_active == True
         )
-        account = result.scalar_one_or_none()
-        if account:
-            account.is_active = False
+        if account_id is not None:
+            query = query.where(ConnectedAccount.id == account_id)
+        accounts = (await db.execute(query)).scalars().all()
+        if accounts:
+            for account in accounts:
+                account.is_active = False
             await db.commit()
+            get_token_cache().invalidate_platform(platform)
+            get_session_store().invalidate(platform)
             return DisconnectAccountResponse(success=True)
         return DisconnectAccountResponse(success=False, error="Account not found")
     except Exception as e:
@@ -353,6 +413,7 @@ async def store_threads_token(
             db.add(account)
 
         await db.commit()
+        get_token_cache().invalidate_platform("threads")
         logger.info(f"[THREADS] Token stored for @{username}")
         return {"success": True, "username": username, "message": "Token stored successfully"}
 
@@ -401,69 +462,71 @@ async def threads_callback(
         raise HTTPException(status_code=400, detail="No authorization code provided")
 
     try:
-        async with httpx.AsyncClient() as client:
-            # Exchange code for access token
-            response = await client.post(
-                "https://graph.threads.net/oauth/access_token",
-                data={
-                    "client_id": THREADS_APP_ID,
-                    "client_secret": THREADS_APP_SECRET,
-                    "grant_type": "authorization_code",
-                    "redirect_uri": THREADS_REDIRECT_URI,
-                    "code": code
-                }
-            )
+        client = get_client("threads")
+
+        # Exchange code for access token
+        response = await client.post(
+            "https://graph.threads.net/oauth/access_token",
+            data={
+                "client_id": THREADS_APP_ID,
+                "client_secret": THREADS_APP_SECRET,
+                "grant_type": "authorization_code",
+                "redirect_uri": THREADS_REDIRECT_URI,
+                "code": code
+            }
+        )
 
-            if response.status_code != 200:
-                logger.error(f"[THREADS OAUTH] Token exchange failed: {response.text}")
-                raise HTTPException(status_code=400, detail="Failed to exchange authorization code")
+        if response.status_code != 200:
+            logger.error(f"[THREADS OAUTH] Token exchange failed: {response.text}")
+            raise HTTPException(status_code=400, detail="Failed to exchange authorization code")
 
-            token_data = response.json()
-            access_token = token_data.get("access_token")
-            user_id = token_data.get("user_id")
-            expires_in = token_data.get("expires_in", 3600)
+        token_data = response.json()
+        access_token = token_data.get("access_token")
+        user_id = token_data.get("user_id")
+        expires_in = token_data.get("expires_in", 3600)
 
-            # Get user profile
-            profile_response = await client.get(
-                f"https://graph.threads.net/v1.0/{user_id}",
-                params={"fields": "id,username", "access_token": access_token}
-            )
+        # Get user profile
+        profile_response = await client.get(
+            f"https://graph.threads.net/v1.0/{user_id}",
+            params={"fields": "id,username", "access_token": access_token}
+        )
 
-            username = f"user_{user_id}"
-            if profile_response.status_code == 200:
-                username = profile_response.json().get("username", username)
+        username = f"user_{user_id}"
+        if profile_response.status_code == 200:
+            username = profile_response.json().get("username", username)
 
-            logger.info(f"[THREADS OAUTH] Authenticated: @{username}")
+        logger.info(f"[THREADS OAUTH] Authenticated: @{username}")
 
-            # Encrypt and save token
-            encryptor = get_encryptor()
-            encrypted_token = encryptor.encrypt(access_token)
-            token_expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
+        # Encrypt and save token
+        encryptor = get_encryptor()
+        encrypted_token = encryptor.encrypt(access_token)
+        token_expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
 
-            # Save to database
-            result = await db.execute(
-                select(ConnectedAccount).where(
-                    ConnectedAccount.platform == 'threads',
-                    ConnectedAccount.username == username
-                )
+        # Save to database
+        result = await db.execute(
+            select(ConnectedAccount).where(
+                ConnectedAccount.platform == 'threads',
+                ConnectedAccount.username == username
             )
-            existing = result.scalar_one_or_none()
-
-            if existing:
-                existing.access_token = encrypted_token
-                existing.token_expires_at = token_expires_at
-                existing.is_active = True
-            else:
-                db.add(ConnectedAccount(
-                    platform='threads',
-                    username=username,
-                    access_token=encrypted_token,
-                    token_expires_at=token_expires_at
-                ))
+        )
+        existing = result.scalar_one_or_none()
 
-            await db.commit()
+        if existing:
+            existing.access_token = encrypted_token
+            existing.token_expires_at = token_expires_at
+            existing.is_active = True
+        else:
+            db.add(ConnectedAccount(
+                platform='threads',
+                username=username,
+                access_token=encrypted_token,
+                token_expires_at=token_expires_at
+            ))
+
+        await db.commit()
+        get_token_cache().invalidate_platform("threads")
 
-            return HTMLResponse(content=f"""
+        return HTMLResponse(content=f"""
 <html>
 <head><style>
 body{{font-family:sans-serif;display:flex;align-items:center;justify-content:center;
@@ -493,66 +556,346 @@ setTimeout(()=>window.close(),2000);
 # Posts Endpoints
 # ============================================================
 
+async def _active_account_platforms(db: AsyncSession) -> dict:
+    """Active connected account id -> platform, for validating posts' account_id"""
+    result = await db.execute(
+        select(ConnectedAccount.id, ConnectedAccount.platform).where(ConnectedAccount.is_active == True)
+    )
+    return dict(result.all())
+
+
 @app.post("/posts", response_model=List[PostResponse])
 async def create_posts(posts: Union[PostCreate, List[PostCreate]], db: AsyncSession = Depends(get_db)):
     """Create one or multiple posts."""
     if not isinstance(posts, list):
         posts = [posts]
 
-    LIMITS = {'twitter': 280, 'threads': 500, 'linkedin': 3000, 'facebook': 63206}
-    created_posts = []
+    accounts = await _active_account_platforms(db) if any(p.account_id is not None for p in posts) else {}
+    rows = []
+    errors = []
+    for index, post_data in enumerate(posts, start=1):
+        try:
+            values = normalize_post(post_data)
+            check_account(values, accounts)
+            rows.append(values)
+        except RecordError as e:
+            errors.append(f"Post {index}: {e}" if len(posts) > 1 else str(e))
+    if errors:
+        raise HTTPException(status_code=400, detail="; ".join(errors))
+
+    # One multi-row INSERT ... RETURNING instead of an INSERT plus a SELECT per post
+    result = await db.scalars(
+        insert(SocialPost).returning(SocialPost, sort_by_parameter_order=True),
+        rows,
+    )
+    created_posts = result.all()
+    await db.commit()
+    logger.info(f"[API] Created {len(created_posts)} post(s) for {', '.join(sorted({p.platform for p in created_posts}))}")
+
+    # Only posts due soon go straight into the due timer; reconciliation loads the rest later
+    horizon = datetime.now(timezone.utc) + timedelta(seconds=DUE_TIMER_HORIZON_SECONDS)
+    for p in created_posts:
+        if p.scheduled_at <= horizon:
+            due_timer.schedule(p.id, p.scheduled_at)
+        get_broadcaster().publish("post.created", {"id": p.id, "status": p.status, "updated_at": p.updated_at})
+    return created_posts
+
+
+BULK_INSERT_CHUNK_SIZE = 500
+BULK_MAX_REPORTED_ERRORS = 100
+# JSON arrays are parsed whole, so their size is capped; NDJSON and CSV are streamed
+BULK_JSON_MAX_BYTES = int(os.getenv("BULK_JSON_MAX_BYTES", str(10 * 1024 * 1024)))
+
+
+@app.post("/posts/bulk")
+async def bulk_create_posts(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Bulk-import posts from a JSON array, NDJSON (application/x-ndjson) or CSV (text/csv) body.
+
+    NDJSON and CSV are read as a stream and validated rows are spooled to a temp file,
+    so memory stays flat regardless of file size. A JSON array is buffered and parsed
+    whole, so it is limited to BULK_JSON_MAX_BYTES (413 beyond that).
+
+    Every row is validated before anything is written; if any row is bad nothing is
+    imported and all bad rows are reported together (422). The rows are then inserted
+    in one short transaction, so the database is never locked while the upload streams.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        records = iter_ndjson(request.stream())
+    elif content_type in ("text/csv", "application/csv"):
+        records = iter_csv(request.stream())
+    elif content_type in ("application/json", ""):
+        declared = request.headers.get("content-length")
+        try:
+            if declared and declared.isdigit() and int(declared) > BULK_JSON_MAX_BYTES:
+                raise BodyTooLarge(f"Body exceeds {BULK_JSON_MAX_BYTES} bytes; send NDJSON or CSV for large imports")
+            records = iter_json_array(await read_body(request.stream(), BULK_JSON_MAX_BYTES))
+        except BodyTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported content type: {content_type}")
 
-    for post_data in posts:
-        if len(post_data.content) > LIMITS.get(post_data.platform, 3000):
-            raise HTTPException(
-                status_code=400,
-                detail=f"Content too long for {post_data.platform.capitalize()}."
+    error_count = 0
+    errors = []
+    chunk = []
+    accounts = await _active_account_platforms(db)
+    # End the read transaction before the upload streams in
+    await db.rollback()
+
+    spool = RowSpool()
+    try:
+        # Phase 1: parse and validate the whole upload, spooling good rows
+        try:
+            async for row, record in records:
+                try:
+                    if isinstance(record, RecordError):
+                        raise record
+                    values = validate_record(record)
+                    check_account(values, accounts)
+                except RecordError as e:
+                    error_count += 1
+                    if len(errors) < BULK_MAX_REPORTED_ERRORS:
+                        errors.append({"row": row, "error": str(e)})
+                    continue
+                # After the first bad row keep validating but stop spooling
+                if error_count:
+                    continue
+                chunk.append(values)
+                if len(chunk) >= BULK_INSERT_CHUNK_SIZE:
+                    await spool.write(chunk)
+                    chunk = []
+            if chunk and not error_count:
+                await spool.write(chunk)
+        except RecordError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        if error_count:
+            logger.warning(f"[API] Bulk import rejected: {error_count} invalid row(s).")
+            return JSONResponse(
+                status_code=422,
+                content={"created": 0, "error_count": error_count, "errors": errors},
             )
-        
-        # Ensure scheduled_at is UTC
-        scheduled_time = post_data.scheduled_at or datetime.now(timezone.utc)
-        if scheduled_time.tzinfo is None:
-            # Assume naive time is local if not specified, or just force UTC if that's the contract
-            # User asked to "Convert time from frontend to UTC"
-            # Best practice: Assume naive is UTC if coming from API, but if frontend sends local...
-            # We will force it to UTC.
-            scheduled_time = scheduled_time.replace(tzinfo=timezone.utc)
-        else:
-            # Convert aware time to UTC
-            scheduled_time = scheduled_time.astimezone(timezone.utc)
-
-        new_post = SocialPost(
-            content=post_data.content,
-            media_url=post_data.media_url,
-            scheduled_at=scheduled_time,
-            platform=post_data.platform,
-            status="pending"  # Explicitly set lowercase pending
+
+        # Phase 2: insert everything in one short transaction
+        # Only posts due soon go straight into the due timer; reconciliation loads the rest later
+        horizon = datetime.now(timezone.utc) + timedelta(seconds=DUE_TIMER_HORIZON_SECONDS)
+        due_soon = []
+        try:
+            async for rows in spool.chunks():
+                result = await db.execute(insert(SocialPost).returning(SocialPost.id, SocialPost.scheduled_at), rows)
+                due_soon.extend((post_id, at) for post_id, at in result.all() if at <= horizon)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        created = spool.count
+    finally:
+        spool.close()
+
+    logger.info(f"[API] Bulk imported {created} posts.")
+
+    for post_id, scheduled_at in due_soon:
+        due_timer.schedule(post_id, scheduled_at)
+    if created:
+        get_broadcaster().publish("posts.imported", {"count": created})
+    return {"created": created, "error_count": 0, "errors": []}
+
+
+# Columns the /posts listing can project; id and scheduled_at always come back for the cursor
+POST_LIST_FIELDS = (
+    "id", "content", "media_url", "media_urls", "thread_parts", "scheduled_at", "platform", "account_id", "status",
+    "error_message", "external_post_id", "attempt_count", "next_attempt_at", "created_at", "updated_at",
+)
+POST_LIST_DEFAULT_LIMIT = 100
+POST_LIST_MAX_LIMIT = 500
+
+# Incremental sync: re-send rows this far behind the client's watermark to cover
+# transactions that stamped updated_at before a later one but committed after it
+POST_SYNC_OVERLAP_SECONDS = float(os.getenv("POST_SYNC_OVERLAP_SECONDS", "5"))
+POST_TOMBSTONE_RETENTION_DAYS = int(os.getenv("POST_TOMBSTONE_RETENTION_DAYS", "7"))
+
+
+def _b64encode(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _b64decode(value: str) -> str:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+
+
+def _encode_cursor(scheduled_at: datetime, post_id: int) -> str:
+    return _b64encode(f"{scheduled_at.isoformat()}|{post_id}")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        scheduled_at, post_id = _b64decode(cursor).rsplit("|", 1)
+        return datetime.fromisoformat(scheduled_at), int(post_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _encode_sync_cursor(watermark: datetime, after_id: Optional[int] = None) -> str:
+    """Sync cursors are a watermark ('w') or, mid-way through a large delta, an exact keyset ('k')"""
+    if after_id is None:
+        return _b64encode(f"w|{watermark.isoformat()}")
+    return _b64encode(f"k|{watermark.isoformat()}|{after_id}")
+
+
+def _decode_sync_cursor(cursor: str) -> Tuple[datetime, Optional[int]]:
+    try:
+        kind, rest = _b64decode(cursor).split("|", 1)
+        if kind == "w":
+            return datetime.fromisoformat(rest), None
+        updated_at, after_id = rest.rsplit("|", 1)
+        return datetime.fromisoformat(updated_at), int(after_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid since cursor")
+
+
+async def _posts_fingerprint(db: AsyncSession) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Latest post change and latest delete; two index lookups, no table scan"""
+    result = await db.execute(
+        select(
+            select(func.max(SocialPost.updated_at)).scalar_subquery(),
+            select(func.max(PostTombstone.deleted_at)).scalar_subquery(),
         )
-        db.add(new_post)
-        created_posts.append(new_post)
-        logger.info(f"[API] Created post for {post_data.platform} scheduled at {scheduled_time}")
+    )
+    return result.one()
 
-    await db.commit()
-    for p in created_posts:
-        await db.refresh(p)
-    return created_posts
 
+async def _posts_delta(db: AsyncSession, query, since: str, limit: int, now: datetime) -> PostsDelta:
+    """Rows created/updated and ids deleted since the client's sync cursor"""
+    watermark, after_id = _decode_sync_cursor(since)
+
+    if after_id is None and watermark < now - timedelta(days=POST_TOMBSTONE_RETENTION_DAYS):
+        # Tombstones older than this may be pruned; the client must start over
+        return PostsDelta(posts=[], deleted=[], cursor=_encode_sync_cursor(now), reset=True)
+
+    deleted: List[int] = []
+    if after_id is None:
+        window_start = watermark - timedelta(seconds=POST_SYNC_OVERLAP_SECONDS)
+        query = query.where(SocialPost.updated_at > window_start)
+        tombstones = await db.execute(
+            select(PostTombstone.post_id).where(PostTombstone.deleted_at > window_start)
+        )
+        deleted = list(tombstones.scalars().all())
+    else:
+        query = query.where(tuple_(SocialPost.updated_at, SocialPost.id) > tuple_(watermark, after_id))
+
+    result = await db.execute(query.order_by(SocialPost.updated_at, SocialPost.id).limit(limit + 1))
+    rows = result.mappings().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if has_more:
+        cursor = _encode_sync_cursor(rows[-1]["updated_at"], rows[-1]["id"])
+    else:
+        # Never move the watermark backwards, and never past the rows actually returned
+        latest = max([watermark] + [row["updated_at"] for row in rows])
+        cursor = _encode_sync_cursor(latest)
+
+    return PostsDelta(
+        posts=[PostListItem(**row) for row in rows],
+        deleted=deleted,
+        cursor=cursor,
+        has_more=has_more,
+    )
+
+
+@app.get("/posts", response_model=Union[List[PostListItem], PostsDelta], response_model_exclude_unset=True)
+async def list_posts(
+    request: Request,
+    response: Response,
+    limit: int = Query(POST_LIST_DEFAULT_LIMIT, ge=1, le=POST_LIST_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    since: Optional[str] = Query(None, description="Sync cursor from X-Sync-Cursor or a previous delta; returns only changes"),
+    status: Optional[PostStatus] = None,
+    platform: Optional[str] = None,
+    scheduled_from: Optional[datetime] = None,
+    scheduled_to: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. id,status,scheduled_at"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    List posts ordered by (scheduled_at, id). The next page's cursor is returned in X-Next-Cursor
+    and a sync cursor for `since=` delta polling in X-Sync-Cursor. Supports If-None-Match.
+    """
+    if fields:
+        requested = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = requested - set(POST_LIST_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        # Delta paging also needs updated_at for its cursor
+        always = {"id", "scheduled_at"} | ({"updated_at"} if since else set())
+        columns = [name for name in POST_LIST_FIELDS if name in requested | always]
+    else:
+        columns = list(POST_LIST_FIELDS)
+
+    try:
+        now = datetime.now(timezone.utc)
+        latest_update, latest_delete = await _posts_fingerprint(db)
+    except Exception as e:
+        logger.error(f"Error fetching posts: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Same data + same query => same representation
+    etag_source = f"{latest_update}|{latest_delete}|{sorted(request.query_params.multi_items())}"
+    etag = f'W/"{hashlib.sha1(etag_source.encode()).hexdigest()[:24]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    query = select(*[getattr(SocialPost, name) for name in columns])
+    if status is not None:
+        query = query.where(SocialPost.status == status)
+    if platform:
+        query = query.where(SocialPost.platform == platform)
+    if scheduled_from:
+        query = query.where(SocialPost.scheduled_at >= scheduled_from)
+    if scheduled_to:
+        query = query.where(SocialPost.scheduled_at < scheduled_to)
 
-@app.get("/posts", response_model=List[PostResponse])
-async def list_posts(db: AsyncSession = Depends(get_db)):
     try:
-        result = await db.execute(select(SocialPost).order_by(SocialPost.scheduled_at))
-        posts = result.scalars().all()
-        for post in posts:
-            if post.scheduled_at and post.scheduled_at.tzinfo is None:
-                post.scheduled_at = post.scheduled_at.replace(tzinfo=timezone.utc)
-            if post.created_at and post.created_at.tzinfo is None:
-                post.created_at = post.created_at.replace(tzinfo=timezone.utc)
-        return posts
+        if since:
+            return await _posts_delta(db, query, since, limit, now)
+
+        if cursor:
+            after_at, after_id = _decode_cursor(cursor)
+            query = query.where(tuple_(SocialPost.scheduled_at, SocialPost.id) > tuple_(after_at, after_id))
+
+        # Fetch one extra row to learn whether another page exists
+        result = await db.execute(query.order_by(SocialPost.scheduled_at, SocialPost.id).limit(limit + 1))
+        rows = result.mappings().all()
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching posts: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = _encode_cursor(last["scheduled_at"], last["id"])
+    # Watermark taken before reading rows: a later delta from here misses nothing
+    response.headers["X-Sync-Cursor"] = _encode_sync_cursor(latest_update or now)
+
+    return [PostListItem(**row) for row in rows]
+
+
+@app.get("/posts/events")
+async def post_events():
+    """Server-Sent Events stream of post.created / post.updated / post.deleted."""
+    broadcaster = get_broadcaster()
+    subscriber = broadcaster.subscribe()
+    return StreamingResponse(
+        broadcaster.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @app.delete("/posts/{post_id}")
 async def delete_post(post_id: int, db: AsyncSession = Depends(get_db)):
@@ -561,13 +904,17 @@ async def delete_post(post_id: int, db: AsyncSession = Depends(get_db)):
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     await db.delete(post)
+    # Leave a tombstone so incremental /posts sync can tell dashboards to drop it
+    await db.merge(PostTombstone(post_id=post_id, deleted_at=datetime.now(timezone.utc)))
     await db.commit()
+    due_timer.discard(post_id)
+    get_broadcaster().publish("post.deleted", {"id": post_id})
     return {"message": "Post deleted successfully"}
 
 
 @app.post("/posts/{post_id}/retry")
 async def retry_post(post_id: int, db: AsyncSession = Depends(get_db)):
-    """Reset a failed post to 'pending' to retry immediately."""
+    """Reset a failed or dead-lettered post to 'pending' to retry immediately, with a fresh attempt budget."""
     result = await db.execute(select(SocialPost).where(SocialPost.id == post_id))
     post = result.scalar_one_or_none()
     
@@ -576,11 +923,32 @@ async def retry_post(post_id: int, db: AsyncSession = Depends(get_db)):
     
     post.status = PostStatus.pending
     post.scheduled_at = datetime.now(timezone.utc)
+    # A manual retry is a new request to publish: lag is measured from now
+    post.due_at = post.scheduled_at
     post.external_post_id = None  # Clear previous ID if any
+    post.error_message = None
+    post.lease_owner = None
+    post.lease_expires_at = None
+    post.attempt_count = 0
+    post.next_attempt_at = None
+    # The user has checked the platform: drop any interrupted-attempt checkpoint
+    post.publish_state = None
     post.updated_at = datetime.now(timezone.utc)
     
     await db.commit()
     await db.refresh(post)
+    if post.scheduled_at <= datetime.now(timezone.utc) + timedelta(seconds=DUE_TIMER_HORIZON_SECONDS):
+        due_timer.schedule(post.id, post.scheduled_at)
+    get_broadcaster().publish("post.updated", {
+        "id": post.id,
+        "status": post.status,
+        "error_message": None,
+        "external_post_id": None,
+        "scheduled_at": post.scheduled_at,
+        "attempt_count": 0,
+        "next_attempt_at": None,
+        "updated_at": post.updated_at,
+    })
     
     logger.info(f"[API] Post {post_id} reset to PENDING for retry.")
     return {"message": "Post queued for retry", "post": post}
@@ -591,6 +959,13 @@ async def health_check():
     return {"status": "ok", "message": "Social Media Scheduler API is running"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint: scheduler, publish path, database, token cache and API metrics."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 # ============================================================
 # Static Files & SPA Catch-All
 # ============================================================
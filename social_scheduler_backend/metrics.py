@@ -0,0 +1,202 @@
+"""
+Prometheus Metrics
+Histograms and counters for the scheduler loop, the publish path, the database and the API,
+plus the small recording hooks adapters and endpoints share. Served at GET /metrics.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+
+from retry_policy import is_retryable
+
+# Latency buckets (seconds) from a fast DB statement up to a slow platform call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Schedule-to-publish lag, up to an hour behind
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, 1800, 3600)
+DUE_POSTS_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+SCHEDULER_TICK_SECONDS = Histogram(
+    "scheduler_tick_duration_seconds",
+    "Time for one scheduler pass to claim and publish the due posts",
+    buckets=LATENCY_BUCKETS,
+)
+SCHEDULER_DUE_POSTS = Histogram(
+    "scheduler_due_posts",
+    "Due posts claimed by one scheduler pass (the due-queue depth it found)",
+    buckets=DUE_POSTS_BUCKETS,
+)
+PUBLISH_LAG_SECONDS = Histogram(
+    "publish_lag_seconds",
+    "Time from a post becoming due to it being published",
+    ["platform"],
+    buckets=LAG_BUCKETS,
+)
+PUBLISH_SECONDS = Histogram(
+    "platform_publish_duration_seconds",
+    "Time spent publishing one post through its platform adapter",
+    ["platform", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+PUBLISH_ERRORS = Counter(
+    "platform_publish_errors_total",
+    "Unsuccessful publish attempts by platform and error class",
+    ["platform", "error_class"],
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "Database statement execution time by statement type",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "API request handling time by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+_DB_OPERATIONS = {
+    "select", "insert", "update", "delete", "with", "pragma", "begin", "commit", "rollback", "create", "alter", "drop",
+}
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels) -> Iterator[None]:
+    """
+    Observe the wall time of a block into `histogram`
+
+    Usage:
+        with timed(HTTP_REQUEST_SECONDS, method="GET", route="/posts", status=200):
+            ...
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        (histogram.labels(**labels) if labels else histogram).observe(time.perf_counter() - started)
+
+
+def publish_error_class(result) -> Optional[str]:
+    """
+    Bucket an unsuccessful PublishResult for the error counter
+
+    Returns:
+        "rate_limited", "deferred", "transient" or "permanent"; None for a success
+    """
+    if result.success:
+        return None
+    if result.status_code == 429:
+        return "rate_limited"
+    if result.retry_after is not None and result.status_code is None and not result.transient:
+        return "deferred"
+    return "transient" if is_retryable(result) else "permanent"
+
+
+def record_publish(platform: str, seconds: float, result=None, error_class: Optional[str] = None):
+    """
+    Record one publish attempt
+
+    Args:
+        platform: Platform name
+        seconds: Time the attempt took
+        result: The PublishResult, if the adapter returned one
+        error_class: Overrides the class derived from `result` (e.g. "exception")
+    """
+    if error_class is None and result is not None:
+        error_class = publish_error_class(result)
+    PUBLISH_SECONDS.labels(platform=platform, outcome=error_class or "published").observe(seconds)
+    if error_class is not None:
+        PUBLISH_ERRORS.labels(platform=platform, error_class=error_class).inc()
+
+
+def record_publish_lag(platform: str, due_at: Optional[datetime], published_at: Optional[datetime] = None):
+    """Observe how long after `due_at` a post went out"""
+    if due_at is None:
+        return
+    if due_at.tzinfo is None:
+        due_at = due_at.replace(tzinfo=timezone.utc)
+    published_at = published_at or datetime.now(timezone.utc)
+    PUBLISH_LAG_SECONDS.labels(platform=platform).observe(max(0.0, (published_at - due_at).total_seconds()))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("metrics_query_started")
+    if not started:
+        return
+    operation = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "other"
+    DB_QUERY_SECONDS.labels(operation=operation if operation in _DB_OPERATIONS else "other").observe(
+        time.perf_counter() - started.pop()
+    )
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute: drop its start time so
+    # later statements on this pooled connection pair with their own
+    conn = context.connection
+    if conn is not None:
+        started = conn.info.get("metrics_query_started")
+        if started:
+            started.pop()
+
+
+def instrument_engine(engine):
+    """
+    Time every statement run on `engine` (an AsyncEngine or Engine); safe to call more than once
+
+    With async drivers the timing includes time the statement's await spent
+    waiting on a busy event loop, which is part of what callers experience.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(sync_engine, "handle_error", _handle_error)
+
+
+class TokenCacheCollector:
+    """Token cache hit/miss counters read at scrape time, so lookups pay nothing extra"""
+
+    def collect(self):
+        from token_cache import get_token_cache
+        cache = get_token_cache()
+        hits = CounterMetricFamily("token_cache_hits", "Access token cache hits")
+        hits.add_metric([], cache.hits)
+        misses = CounterMetricFamily("token_cache_misses", "Access token cache misses")
+        misses.add_metric([], cache.misses)
+        lookups = cache.hits + cache.misses
+        ratio = GaugeMetricFamily("token_cache_hit_ratio", "Share of token lookups served from the cache")
+        ratio.add_metric([], cache.hits / lookups if lookups else 0.0)
+        return [hits, misses, ratio]
+
+
+REGISTRY.register(TokenCacheCollector())
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Current metrics in the Prometheus text format
+
+    With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR so every scrape
+    aggregates all workers (the token cache collector is then left out, since
+    it only sees the worker that answered).
+
+    Returns:
+        (body, content type)
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
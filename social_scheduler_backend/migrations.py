@@ -0,0 +1,385 @@
+"""
+Schema Migrations
+Versioned, run-once schema changes with batched (online) data backfills
+
+Every step must be idempotent: a fresh database gets the full current
+schema from the baseline step, so later steps find their columns and
+indexes already present and only backfill data.
+
+Usage:
+    python migrations.py            # apply pending migrations
+    python migrations.py --status   # list applied / pending migrations
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, List, NamedTuple
+
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, String, inspect, select, update, insert, or_, func, text, column, table,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import CreateTable, CreateIndex
+
+from database import Base
+from models import UTCDateTime, SocialPost, utcnow
+
+logger = logging.getLogger(__name__)
+
+# Run pending migrations in the app's lifespan; disable when a deploy step runs them instead
+RUN_MIGRATIONS_ON_STARTUP = os.getenv("RUN_MIGRATIONS_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+# Rows per backfill transaction: small enough that no statement holds the table for long
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+# Pause between backfill batches so application writes interleave
+MIGRATION_BATCH_PAUSE_SECONDS = float(os.getenv("MIGRATION_BATCH_PAUSE_SECONDS", "0.05"))
+# The migration lock is a lease: a runner that dies mid-migration is taken over after this long
+MIGRATION_LOCK_SECONDS = int(os.getenv("MIGRATION_LOCK_SECONDS", "300"))
+MIGRATION_LOCK_POLL_SECONDS = 1.0
+
+RUNNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Bookkeeping tables live outside Base.metadata so the baseline never touches them
+migration_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations", migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", UTCDateTime, nullable=False),
+)
+
+schema_migration_lock = Table(
+    "schema_migration_lock", migration_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("owner", String(100), nullable=True),
+    Column("expires_at", UTCDateTime, nullable=True),
+)
+
+# Plain-typed view of social_posts for data backfills: legacy rows may hold
+# values (e.g. "failed: <error>") the model's Enum type would refuse to load
+legacy_posts = table(
+    "social_posts",
+    column("id", Integer),
+    column("status", String),
+    column("error_message", String),
+    column("created_at", UTCDateTime),
+    column("scheduled_at", UTCDateTime),
+    column("updated_at", UTCDateTime),
+    column("due_at", UTCDateTime),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[AsyncEngine, "MigrationLock"], Awaitable[None]]
+
+
+class MigrationLock:
+    """
+    Cross-process lease on the single schema_migration_lock row
+
+    Works the same on SQLite and PostgreSQL, and unlike a transaction-scoped
+    lock it can be held across the many short transactions of a backfill.
+    """
+
+    def __init__(self, engine: AsyncEngine, owner: str = RUNNER_ID, lease_seconds: int = MIGRATION_LOCK_SECONDS):
+        self.engine = engine
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+
+    async def acquire(self) -> bool:
+        """Take the lock if it is free or its holder's lease has lapsed"""
+        now = datetime.now(timezone.utc)
+        async with self.engine.begin() as conn:
+            result = await conn.execute(
+                update(schema_migration_lock)
+                .where(
+                    schema_migration_lock.c.id == 1,
+                    or_(
+                        schema_migration_lock.c.owner.is_(None),
+                        schema_migration_lock.c.expires_at < now,
+                    ),
+                )
+                .values(owner=self.owner, expires_at=now + timedelta(seconds=self.lease_seconds))
+            )
+            return result.rowcount == 1
+
+    async def renew(self):
+        """Extend the lease; called between backfill batches"""
+        async with self.engine.begin() as conn:
+            result = await conn.execute(
+                update(schema_migration_lock)
+                .where(schema_migration_lock.c.id == 1, schema_migration_lock.c.owner == self.owner)
+                .values(expires_at=datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds))
+            )
+        if result.rowcount != 1:
+            raise RuntimeError("Migration lock was lost to another runner")
+
+    async def release(self):
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                update(schema_migration_lock)
+                .where(schema_migration_lock.c.id == 1, schema_migration_lock.c.owner == self.owner)
+                .values(owner=None, expires_at=None)
+            )
+
+
+# ============================================================
+# Helpers
+# ============================================================
+
+async def _ensure_bookkeeping(engine: AsyncEngine):
+    """Create the bookkeeping tables and the lock row (safe to race)"""
+    async with engine.begin() as conn:
+        for bookkeeping_table in migration_metadata.sorted_tables:
+            await conn.execute(CreateTable(bookkeeping_table, if_not_exists=True))
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(insert(schema_migration_lock).values(id=1))
+    except IntegrityError:
+        pass  # Another process created it first
+
+
+async def _applied_versions(engine: AsyncEngine) -> set:
+    async with engine.connect() as conn:
+        return set((await conn.execute(select(schema_migrations.c.version))).scalars())
+
+
+async def _add_missing_columns(engine: AsyncEngine, model_table: Table, names: List[str]):
+    """
+    ALTER TABLE ... ADD COLUMN for model columns the live table lacks
+
+    Only nullable columns or NOT NULL columns with a constant server
+    default are added this way: on both SQLite and PostgreSQL (11+) that
+    is a catalog change, not a table rewrite.
+    """
+    async with engine.begin() as conn:
+        existing = await conn.run_sync(
+            lambda sync_conn: {c["name"] for c in inspect(sync_conn).get_columns(model_table.name)}
+        )
+        for name in names:
+            if name in existing:
+                continue
+            col = model_table.c[name]
+            ddl = f"{name} {col.type.compile(dialect=conn.dialect)}"
+            if col.server_default is not None:
+                default = col.server_default.arg
+                # String defaults are quoted, as CREATE TABLE would render them
+                ddl += f" DEFAULT '{default}'" if isinstance(default, str) else f" DEFAULT {default.text}"
+            if not col.nullable:
+                ddl += " NOT NULL"
+            await conn.execute(text(f"ALTER TABLE {model_table.name} ADD COLUMN {ddl}"))
+            logger.info(f"[MIGRATIONS] Added column {model_table.name}.{name}")
+
+
+async def _create_missing_indexes(engine: AsyncEngine, model_table: Table, names: List[str]):
+    """
+    Create the named model indexes that don't exist yet
+
+    On PostgreSQL indexes are built CONCURRENTLY (outside a transaction) so
+    writes to the table continue during the build.
+    """
+    indexes = [index for index in model_table.indexes if index.name in names]
+    if engine.dialect.name == "postgresql":
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            for index in indexes:
+                ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=conn.dialect))
+                await conn.execute(text(ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)))
+        return
+
+    async with engine.begin() as conn:
+        for index in indexes:
+            await conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+async def _backfill(engine: AsyncEngine, lock: MigrationLock, label: str, pending_ids, values):
+    """
+    Apply `values` to rows matched by the `pending_ids` subquery, one batch per transaction
+
+    `pending_ids` must stop matching a row once it has been updated, so the
+    loop ends when a batch comes back empty and a restart resumes where a
+    crashed run stopped.
+    """
+    total = 0
+    while True:
+        batch = pending_ids.limit(MIGRATION_BATCH_SIZE).scalar_subquery()
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                update(legacy_posts).where(legacy_posts.c.id.in_(batch)).values(**values)
+            )
+        if result.rowcount <= 0:
+            break
+        total += result.rowcount
+        await lock.renew()
+        await asyncio.sleep(MIGRATION_BATCH_PAUSE_SECONDS)
+    if total:
+        logger.info(f"[MIGRATIONS] Backfilled {total} rows: {label}")
+
+
+# ============================================================
+# Migrations
+# ============================================================
+
+async def _baseline(engine: AsyncEngine, lock: MigrationLock):
+    """Create any missing tables from the current models"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def _post_publish_columns(engine: AsyncEngine, lock: MigrationLock):
+    """Columns added for the publish engine: error details and the claim lease"""
+    await _add_missing_columns(
+        engine, SocialPost.__table__, ["error_message", "lease_owner", "lease_expires_at", "updated_at"]
+    )
+
+
+async def _post_indexes(engine: AsyncEngine, lock: MigrationLock):
+    """Claim, listing and delta-sync indexes on social_posts"""
+    # Named explicitly: indexes on columns added by later migrations are created there
+    await _create_missing_indexes(engine, SocialPost.__table__, [
+        "ix_social_posts_id", "ix_social_posts_updated_at",
+        "ix_social_posts_status_scheduled_at", "ix_social_posts_scheduled_at_id",
+    ])
+
+
+async def _split_failed_status(engine: AsyncEngine, lock: MigrationLock):
+    """Move legacy "failed: <error>" statuses into status=failed + error_message"""
+    await _backfill(
+        engine, lock, "failed status -> error_message",
+        select(legacy_posts.c.id).where(legacy_posts.c.status.like("failed:%")),
+        {
+            "error_message": func.trim(func.substr(legacy_posts.c.status, len("failed:") + 1)),
+            "status": "failed",
+        },
+    )
+
+
+async def _backfill_updated_at(engine: AsyncEngine, lock: MigrationLock):
+    """Legacy rows only got updated_at on their first update; delta sync needs it everywhere"""
+    await _backfill(
+        engine, lock, "updated_at",
+        select(legacy_posts.c.id).where(legacy_posts.c.updated_at.is_(None)),
+        {"updated_at": func.coalesce(legacy_posts.c.created_at, legacy_posts.c.scheduled_at)},
+    )
+
+
+async def _post_retry_columns(engine: AsyncEngine, lock: MigrationLock):
+    """Attempt counter and next-attempt time for automatic publish retries"""
+    await _add_missing_columns(engine, SocialPost.__table__, ["attempt_count", "next_attempt_at"])
+
+
+async def _post_publish_state(engine: AsyncEngine, lock: MigrationLock):
+    """Publish checkpoint column for crash-safe, resumable publishing"""
+    await _add_missing_columns(engine, SocialPost.__table__, ["publish_state"])
+
+
+async def _post_carousel_and_thread_columns(engine: AsyncEngine, lock: MigrationLock):
+    """Carousel media list and reply-chain parts for Threads posts"""
+    await _add_missing_columns(engine, SocialPost.__table__, ["media_urls", "thread_parts"])
+
+
+async def _post_account_id(engine: AsyncEngine, lock: MigrationLock):
+    """Bind posts to a connected account (NULL keeps the platform default)"""
+    await _add_missing_columns(engine, SocialPost.__table__, ["account_id"])
+    await _create_missing_indexes(engine, SocialPost.__table__, ["ix_social_posts_account_id"])
+
+
+async def _post_due_at(engine: AsyncEngine, lock: MigrationLock):
+    """Original due time, kept apart from scheduled_at (which retries and deferrals move)"""
+    await _add_missing_columns(engine, SocialPost.__table__, ["due_at"])
+    await _backfill(
+        engine, lock, "due_at",
+        select(legacy_posts.c.id).where(legacy_posts.c.due_at.is_(None)),
+        {"due_at": legacy_posts.c.scheduled_at},
+    )
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline", _baseline),
+    Migration(2, "post_publish_columns", _post_publish_columns),
+    Migration(3, "post_indexes", _post_indexes),
+    Migration(4, "split_failed_status", _split_failed_status),
+    Migration(5, "backfill_updated_at", _backfill_updated_at),
+    Migration(6, "post_retry_columns", _post_retry_columns),
+    Migration(7, "post_publish_state", _post_publish_state),
+    Migration(8, "post_carousel_and_thread_columns", _post_carousel_and_thread_columns),
+    Migration(9, "post_account_id", _post_account_id),
+    Migration(10, "post_due_at", _post_due_at),
+]
+
+
+# ============================================================
+# Runner
+# ============================================================
+
+async def pending_migrations(engine: AsyncEngine) -> List[Migration]:
+    """Migrations not yet recorded in schema_migrations"""
+    await _ensure_bookkeeping(engine)
+    applied = await _applied_versions(engine)
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+
+async def run_migrations(engine: AsyncEngine) -> int:
+    """
+    Apply pending migrations exactly once across all workers/replicas
+
+    One process takes the migration lock and applies the steps in order;
+    the others wait until the lock is free and find nothing left to do.
+
+    Returns:
+        Number of migrations applied by this process
+    """
+    lock = MigrationLock(engine)
+    applied_count = 0
+    while True:
+        pending = await pending_migrations(engine)
+        if not pending:
+            return applied_count
+        if not await lock.acquire():
+            logger.info("[MIGRATIONS] Another process is migrating; waiting...")
+            await asyncio.sleep(MIGRATION_LOCK_POLL_SECONDS)
+            continue
+        try:
+            # Re-read under the lock: the previous holder may have finished
+            for migration in await pending_migrations(engine):
+                logger.info(f"[MIGRATIONS] Applying {migration.version:04d}_{migration.name}...")
+                await migration.apply(engine, lock)
+                async with engine.begin() as conn:
+                    await conn.execute(insert(schema_migrations).values(
+                        version=migration.version, name=migration.name, applied_at=utcnow(),
+                    ))
+                await lock.renew()
+                applied_count += 1
+        finally:
+            await lock.release()
+
+
+async def _main(args):
+    from database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        if args.status:
+            pending = {m.version for m in await pending_migrations(engine)}
+            for migration in MIGRATIONS:
+                state = "pending" if migration.version in pending else "applied"
+                print(f"{migration.version:04d}_{migration.name:<28} {state}")
+        else:
+            count = await run_migrations(engine)
+            print(f"Applied {count} migration(s)")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="List migrations without applying them")
+    asyncio.run(_main(parser.parse_args()))
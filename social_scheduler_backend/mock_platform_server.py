@@ -0,0 +1,196 @@
+"""
+Mock Platform Server
+Local stand-in for the LinkedIn ugcPosts and Threads Graph API publish endpoints,
+with configurable latency, error rate and 429 throttling
+
+Run:
+    MOCK_LATENCY_MS=200 MOCK_MEDIA_PROCESSING_SECONDS=5 uvicorn mock_platform_server:app --port 9100
+
+Then point the publish path at it:
+    LINKEDIN_API_BASE_URL=http://127.0.0.1:9100
+    THREADS_API_BASE_URL=http://127.0.0.1:9100/v1.0
+
+Fault injection (write endpoints only, status reads are never faulted):
+    MOCK_ERROR_RATE=0.05         answer 5% of writes with HTTP 500
+    MOCK_THROTTLE_RATE=0.02      answer 2% of writes with HTTP 429 + Retry-After
+    MOCK_RATE_LIMIT=100          allow 100 writes per platform per window, then 429
+    MOCK_RATE_LIMIT_WINDOW_SECONDS=60
+
+GET /stats reports what was served; POST /stats/reset clears it between runs.
+"""
+
+import asyncio
+import itertools
+import os
+import random
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "200"))
+# Extra latency drawn uniformly from [0, jitter] per request, for a realistic tail
+MOCK_LATENCY_JITTER_MS = float(os.getenv("MOCK_LATENCY_JITTER_MS", "0"))
+# Threads image/video containers stay IN_PROGRESS this long before they can be published
+MOCK_MEDIA_PROCESSING_SECONDS = float(os.getenv("MOCK_MEDIA_PROCESSING_SECONDS", "0"))
+# Fraction of write requests failed with HTTP 500 / throttled with HTTP 429
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+MOCK_THROTTLE_RATE = float(os.getenv("MOCK_THROTTLE_RATE", "0"))
+# Retry-After sent with random throttles
+MOCK_RETRY_AFTER_SECONDS = int(os.getenv("MOCK_RETRY_AFTER_SECONDS", "1"))
+# Fixed-window write quota per platform (0 = unlimited), advertised via X-RateLimit-* headers
+MOCK_RATE_LIMIT = int(os.getenv("MOCK_RATE_LIMIT", "0"))
+MOCK_RATE_LIMIT_WINDOW_SECONDS = float(os.getenv("MOCK_RATE_LIMIT_WINDOW_SECONDS", "60"))
+MOCK_SEED = os.getenv("MOCK_SEED")
+
+app = FastAPI(title="Mock Platform Server")
+
+_ids = itertools.count(1)
+_rng = random.Random(int(MOCK_SEED) if MOCK_SEED else None)
+# (endpoint, outcome) -> count, e.g. ("threads_publish", "ok")
+_stats: Counter = Counter()
+# Platform -> (window start, writes in window)
+_windows: Dict[str, list] = {}
+
+
+async def _simulate_latency():
+    delay_ms = MOCK_LATENCY_MS + (_rng.uniform(0, MOCK_LATENCY_JITTER_MS) if MOCK_LATENCY_JITTER_MS > 0 else 0)
+    if delay_ms > 0:
+        await asyncio.sleep(delay_ms / 1000)
+
+
+def _quota_headers(platform: str) -> Dict[str, str]:
+    """Count a write against the platform's window and describe what is left"""
+    if MOCK_RATE_LIMIT <= 0:
+        return {}
+    now = time.monotonic()
+    window = _windows.get(platform)
+    if window is None or now - window[0] >= MOCK_RATE_LIMIT_WINDOW_SECONDS:
+        window = _windows[platform] = [now, 0]
+    window[1] += 1
+    reset = max(1, int(window[0] + MOCK_RATE_LIMIT_WINDOW_SECONDS - now + 0.999))
+    return {
+        "x-ratelimit-limit": str(MOCK_RATE_LIMIT),
+        "x-ratelimit-remaining": str(max(0, MOCK_RATE_LIMIT - window[1])),
+        "x-ratelimit-reset": str(reset),
+    }
+
+
+async def _write(endpoint: str, platform: str) -> Optional[JSONResponse]:
+    """
+    Common handling for write endpoints: latency, quota and injected faults
+
+    Returns:
+        The error response to send instead of the real one, or None to proceed
+    """
+    await _simulate_latency()
+    headers = _quota_headers(platform)
+    if headers and _windows[platform][1] > MOCK_RATE_LIMIT:
+        _stats[(endpoint, "rate_limited")] += 1
+        return JSONResponse(
+            {"error": {"message": "Application request limit reached", "code": 4}},
+            status_code=429,
+            headers=dict(headers, **{"retry-after": headers["x-ratelimit-reset"]}),
+        )
+    roll = _rng.random()
+    if roll < MOCK_THROTTLE_RATE:
+        _stats[(endpoint, "throttled")] += 1
+        return JSONResponse(
+            {"error": {"message": "Too many requests", "code": 4}},
+            status_code=429,
+            headers=dict(headers, **{"retry-after": str(MOCK_RETRY_AFTER_SECONDS)}),
+        )
+    if roll < MOCK_THROTTLE_RATE + MOCK_ERROR_RATE:
+        _stats[(endpoint, "error")] += 1
+        return JSONResponse(
+            {"error": {"message": "An unexpected error has occurred", "code": 2, "is_transient": True}},
+            status_code=500,
+            headers=headers,
+        )
+    _stats[(endpoint, "ok")] += 1
+    return None
+
+
+@app.post("/v2/ugcPosts", status_code=201)
+async def linkedin_ugc_posts():
+    fault = await _write("linkedin_ugc_posts", "linkedin")
+    if fault is not None:
+        return fault
+    return {"id": f"urn:li:share:{next(_ids)}"}
+
+
+# Container id -> lifecycle status, so resumed publishes can check what happened
+_containers = {}
+# Container id -> monotonic time its media finishes processing
+_processing_until = {}
+
+
+def _container_status(container_id: str):
+    status = _containers.get(container_id)
+    if status == "IN_PROGRESS" and time.monotonic() >= _processing_until.get(container_id, 0):
+        status = _containers[container_id] = "FINISHED"
+    return status
+
+
+@app.post("/v1.0/me/threads")
+async def threads_create_container(request: Request):
+    fault = await _write("threads_create", "threads")
+    if fault is not None:
+        return fault
+    body = await request.json()
+    container_id = f"container_{next(_ids)}"
+    if body.get("media_type", "TEXT") != "TEXT" and MOCK_MEDIA_PROCESSING_SECONDS > 0:
+        _containers[container_id] = "IN_PROGRESS"
+        _processing_until[container_id] = time.monotonic() + MOCK_MEDIA_PROCESSING_SECONDS
+    else:
+        _containers[container_id] = "FINISHED"
+    return {"id": container_id}
+
+
+@app.post("/v1.0/me/threads_publish")
+async def threads_publish_container(request: Request):
+    fault = await _write("threads_publish", "threads")
+    if fault is not None:
+        return fault
+    body = await request.json()
+    container_id = body.get("creation_id")
+    status = _container_status(container_id)
+    if status == "PUBLISHED":
+        return JSONResponse({"error": {"message": "Container already published"}}, status_code=400)
+    if status != "FINISHED":
+        return JSONResponse({"error": {"message": "Media is not ready to be published"}}, status_code=400)
+    _containers[container_id] = "PUBLISHED"
+    return {"id": f"thread_{next(_ids)}"}
+
+
+@app.get("/v1.0/{container_id}")
+async def threads_container_status(container_id: str):
+    await _simulate_latency()
+    _stats[("threads_status", "ok")] += 1
+    status = _container_status(container_id)
+    if status is None:
+        return JSONResponse({"error": {"message": "Unknown container"}}, status_code=404)
+    return {"id": container_id, "status": status}
+
+
+@app.get("/stats")
+async def stats():
+    """Requests served per endpoint and outcome (ok, error, throttled, rate_limited)"""
+    summary: Dict[str, Dict[str, int]] = {}
+    for (endpoint, outcome), count in sorted(_stats.items()):
+        summary.setdefault(endpoint, {})[outcome] = count
+    return summary
+
+
+@app.post("/stats/reset")
+async def reset_stats():
+    _stats.clear()
+    _windows.clear()
+    return {"status": "reset"}
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
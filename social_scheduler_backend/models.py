@@ -1,12 +1,40 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, UniqueConstraint
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, UniqueConstraint, Index, Enum, JSON
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
 from database import Base
 import enum
 
+class UTCDateTime(TypeDecorator):
+    """Timezone-aware UTC datetimes on every backend (SQLite stores them naive)"""
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None and value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
 class PostStatus(str, enum.Enum):
     pending = "pending"
     published = "published"
     failed = "failed"
+    # Transient failures that exhausted their automatic retries
+    dead_letter = "dead_letter"
+
+
+def _initial_due_at(context):
+    """Insert default for SocialPost.due_at: the scheduled_at the row is created with"""
+    return context.get_current_parameters().get("scheduled_at")
+
 
 class SocialPost(Base):
     __tablename__ = "social_posts"
@@ -14,12 +42,51 @@ class SocialPost(Base):
     id = Column(Integer, primary_key=True, index=True)
     content = Column(String, nullable=False)
     media_url = Column(String, nullable=True)
-    scheduled_at = Column(DateTime(timezone=True), nullable=False)
+    # Threads carousel: 2-20 image/video URLs published as one post (instead of media_url)
+    media_urls = Column(JSON, nullable=True)
+    # Threads chain: follow-up texts, each posted as a reply to the previous part
+    thread_parts = Column(JSON, nullable=True)
+    scheduled_at = Column(UTCDateTime, nullable=False)
+    # When the user wanted the post out: scheduled_at as created (or manually retried), never
+    # moved by automatic retries or quota deferrals, so publish lag is measured from it
+    due_at = Column(UTCDateTime, nullable=True, default=_initial_due_at)
     platform = Column(String, nullable=False)
-    status = Column(String, default=PostStatus.pending.value)
+    # ConnectedAccount to publish as; NULL publishes as the platform's default account
+    account_id = Column(Integer, nullable=True, index=True)
+    # Stored as the enum value in a short VARCHAR; failure details live in error_message
+    status = Column(
+        Enum(PostStatus, native_enum=False, length=20, values_callable=lambda e: [m.value for m in e]),
+        nullable=False,
+        default=PostStatus.pending,
+    )
+    error_message = Column(Text, nullable=True)
     external_post_id = Column(String, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Publish lease: the worker that claimed the post and when the claim lapses
+    lease_owner = Column(String(100), nullable=True)
+    lease_expires_at = Column(UTCDateTime, nullable=True)
+    # Automatic retries: attempts made so far and when the next one runs (mirrors scheduled_at while retrying)
+    attempt_count = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = Column(UTCDateTime, nullable=True)
+    # Checkpoint of an in-progress publish (e.g. the Threads container id), written before the
+    # platform call that makes the post public so a crashed attempt resumes instead of reposting
+    publish_state = Column(JSON, nullable=True)
+    created_at = Column(UTCDateTime, server_default=func.now())
+    # Set on insert and every update (microsecond precision) so it can drive incremental sync
+    updated_at = Column(UTCDateTime, default=utcnow, onupdate=utcnow, index=True)
+
+    __table_args__ = (
+        # Due-post claims and dashboard status filters are range scans on this index
+        Index('ix_social_posts_status_scheduled_at', 'status', 'scheduled_at'),
+        # Keyset pagination of the /posts listing
+        Index('ix_social_posts_scheduled_at_id', 'scheduled_at', 'id'),
+    )
+
+class PostTombstone(Base):
+    """Records deleted posts so incremental /posts sync can tell clients to drop them"""
+    __tablename__ = "post_tombstones"
+
+    post_id = Column(Integer, primary_key=True)
+    deleted_at = Column(UTCDateTime, nullable=False, default=utcnow, index=True)
 
 class ConnectedAccount(Base):
     __tablename__ = "connected_accounts"
@@ -34,11 +101,11 @@ class ConnectedAccount(Base):
     
     # For OAuth-based auth (Threads API, LinkedIn, etc.)
     access_token = Column(Text, nullable=True)  # Encrypted OAuth access token
-    token_expires_at = Column(DateTime(timezone=True), nullable=True)  # Token expiration
+    token_expires_at = Column(UTCDateTime, nullable=True)  # Token expiration
     
     is_active = Column(Boolean, default=True)
-    connected_at = Column(DateTime(timezone=True), server_default=func.now())
-    last_used_at = Column(DateTime(timezone=True), nullable=True)
+    connected_at = Column(UTCDateTime, server_default=func.now())
+    last_used_at = Column(UTCDateTime, nullable=True)
     
     __table_args__ = (
         UniqueConstraint('platform', 'username', name='unique_platform_username'),
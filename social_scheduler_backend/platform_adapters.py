@@ -0,0 +1,579 @@
+"""
+Platform Adapters
+One adapter per social platform behind a common async interface (publish, batch
+publish, validate, capabilities), kept in a registry that is loaded once at startup
+"""
+
+import asyncio
+import importlib
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import httpx
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from encryption import get_encryptor
+from http_clients import get_client
+from models import ConnectedAccount
+from rate_limiter import get_rate_limiter, RATE_LIMIT_DEFAULT_BACKOFF_SECONDS
+from retry_policy import is_transient_exception
+from threads_api_service import ThreadsAPIService, CONTAINER_MAX_WAIT_SECONDS
+from token_cache import get_token_cache
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Character limit for platforms that don't declare one
+DEFAULT_CHAR_LIMIT = 3000
+# Latency of the simulated publish used for platforms without a real integration
+SIMULATED_PUBLISH_LATENCY_SECONDS = float(os.getenv("SIMULATED_PUBLISH_LATENCY_SECONDS", "1"))
+# Extra adapter modules to import at startup (comma-separated); each calls register_adapter()
+PLATFORM_ADAPTER_MODULES = [m.strip() for m in os.getenv("PLATFORM_ADAPTER_MODULES", "").split(",") if m.strip()]
+
+# Failures that guarantee the request never reached the platform
+REQUEST_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Base URL override lets benchmarks point the publish path at a local mock server
+LINKEDIN_API_BASE_URL = os.getenv("LINKEDIN_API_BASE_URL", "https://api.linkedin.com").rstrip("/")
+
+
+class PublishResult(NamedTuple):
+    """Outcome of one publish attempt"""
+    success: bool
+    post_id: Optional[str] = None
+    error: Optional[str] = None
+    # HTTP status of the failing platform response, when there was one
+    status_code: Optional[int] = None
+    # Set when the account is over quota: defer the post by this many seconds instead of failing it
+    retry_after: Optional[float] = None
+    # The failure had no HTTP status but is worth retrying (timeout, connection error)
+    transient: bool = False
+
+
+class LeaseLost(Exception):
+    """This worker no longer owns the post; another one may be publishing it"""
+
+
+class PublishCheckpoint:
+    """
+    Durable per-post publish progress (SocialPost.publish_state)
+
+    Senders save their intermediate state (e.g. a Threads container id)
+    *before* the platform call that makes the post public, and read it back
+    on the next attempt to resume instead of publishing twice. This base
+    class keeps the state in memory only; the PublishEngine passes one that
+    commits to the database.
+    """
+
+    def __init__(self, state: Optional[dict] = None):
+        self.state = dict(state or {})
+
+    async def save(self, state: Optional[dict]):
+        """Persist `state` (None clears it); raises LeaseLost if the post was taken over"""
+        self.state = dict(state or {})
+
+
+def _deferred(platform: str, account: str, delay: float, error: Optional[str] = None, status_code: Optional[int] = None) -> PublishResult:
+    msg = error or f"Rate limit reached for {platform} account {account}"
+    logger.warning(f"[{platform.upper()}] Deferring post by {delay:.0f}s: {msg}")
+    return PublishResult(False, None, msg, status_code, delay)
+
+
+async def _threads_account(db, account_id: Optional[int]) -> Optional[Tuple[str, str, int]]:
+    """
+    Resolve the Threads account to publish as, via the token cache then the database
+
+    Args:
+        db: AsyncSession for cache misses (None: cache only)
+        account_id: The post's account; None picks the default (oldest active) account
+
+    Returns:
+        (access_token, username, account_id), or None if there is no usable account
+    """
+    token_cache = get_token_cache()
+    if account_id is not None:
+        cached = token_cache.get(account_id)
+        if cached is not None:
+            return cached.access_token, cached.username, cached.account_id
+    else:
+        known, cached = token_cache.lookup_active('threads')
+        if known:
+            return (cached.access_token, cached.username, cached.account_id) if cached else None
+    if db is None:
+        return None
+
+    query = select(ConnectedAccount).where(
+        ConnectedAccount.platform == 'threads',
+        ConnectedAccount.is_active == True
+    )
+    if account_id is not None:
+        query = query.where(ConnectedAccount.id == account_id)
+    else:
+        query = query.where(ConnectedAccount.access_token.is_not(None)).order_by(ConnectedAccount.id).limit(1)
+    # Database errors propagate: a failed lookup is not a missing account
+    account = (await db.execute(query)).scalars().first()
+    if account and account.access_token:
+        try:
+            access_token = get_encryptor().decrypt(account.access_token)
+        except Exception as e:
+            logger.error(f"[THREADS] Error decrypting DB token: {e}")
+            return None
+        token_cache.put(
+            'threads', account.id, account.username, access_token, account.token_expires_at,
+            active=account_id is None,
+        )
+        logger.info(f"[THREADS] Using connected account from DB: @{account.username}")
+        return access_token, account.username, account.id
+    if account_id is None:
+        token_cache.put('threads', None)
+    return None
+
+
+def _quota_charged(state: dict) -> bool:
+    """Whether a Threads post's checkpoint already holds its quota charge (older checkpoints predate the flag)"""
+    return bool(state.get("charged") or state.get("container_id") or state.get("post_id"))
+
+
+def _threads_failure(platform: str, username: str, api, result: dict, refund: bool, prefix: str = "") -> PublishResult:
+    """Turn a failed ThreadsAPIService result into a deferral or a (possibly retryable) failure"""
+    error_msg = f"{prefix}{result.get('error')}"
+    status_code = result.get('status_code')
+    limiter = get_rate_limiter()
+    blocked_for = limiter.blocked_for(platform, username)
+    if status_code == 429 or blocked_for:
+        return _deferred(platform, username, blocked_for or RATE_LIMIT_DEFAULT_BACKOFF_SECONDS, error_msg, status_code)
+    logger.error(f"[{platform.upper()}] ✗ Failed to post: {error_msg}")
+    if refund:
+        limiter.refund(platform, username)
+    transient = api.last_exception is not None and is_transient_exception(api.last_exception)
+    return PublishResult(False, None, error_msg, status_code, transient=transient)
+
+
+async def _post_thread_replies(platform: str, username: str, api, checkpoint: PublishCheckpoint, parts: List[str]) -> Optional[PublishResult]:
+    """
+    Post the remaining parts of a thread, each as a reply to the one before
+
+    The checkpoint tracks the root post, the post to reply to and how many
+    parts are out, so a retry continues the chain where it stopped.
+
+    Returns:
+        None once every part is published, otherwise the failure to report
+    """
+    root_id = checkpoint.state["post_id"]
+    for index in range(checkpoint.state.get("parts_done", 0), len(parts)):
+        reply = await api.create_post(
+            parts[index],
+            reply_to_id=checkpoint.state["reply_to_id"],
+            container_id=checkpoint.state.get("reply_container_id"),
+            on_container=lambda cid: checkpoint.save(dict(checkpoint.state, reply_container_id=cid)),
+        )
+        if not reply["success"]:
+            prefix = f"Published the first part ({root_id}) and {index} of {len(parts)} replies; reply {index + 1} failed: "
+            return _threads_failure(platform, username, api, reply, refund=False, prefix=prefix)
+        if index + 1 == len(parts):
+            break
+        if reply.get("already_published"):
+            msg = (f"Reply {index + 1} of {len(parts)} was published by an interrupted attempt but its id was not "
+                   "recorded, so the rest of the thread could not be attached. Post them manually.")
+            logger.error(f"[{platform.upper()}] ✗ {msg}")
+            return PublishResult(False, None, msg)
+        await checkpoint.save({"post_id": root_id, "reply_to_id": reply["post_id"], "parts_done": index + 1})
+    logger.info(f"[{platform.upper()}] ✓ Thread complete: {len(parts)} replies under {root_id}")
+    return None
+
+
+class PublishRequest(NamedTuple):
+    """One post to publish, as handed to an adapter"""
+    content: str
+    media_url: Optional[str] = None
+    media_urls: Optional[List[str]] = None
+    thread_parts: Optional[List[str]] = None
+    account_id: Optional[int] = None
+    checkpoint: Optional[PublishCheckpoint] = None
+
+
+class PlatformAdapter:
+    """Base adapter: a platform's limits, post validation and publishing"""
+
+    name = ""
+    char_limit = DEFAULT_CHAR_LIMIT
+    # Carousel size range; 0 means the platform takes no carousels
+    min_carousel_items = 0
+    max_carousel_items = 0
+    # Whether follow-up parts can be chained as replies
+    supports_threads = False
+    # Whether a post can be bound to a ConnectedAccount (account_id) and published as it
+    supports_accounts = False
+
+    def capabilities(self) -> Dict[str, Any]:
+        """What the platform accepts and how fast it may be published to"""
+        posts_per_window, window_seconds = get_rate_limiter().limits.get(self.name, (None, None))
+        return {
+            "platform": self.name,
+            "char_limit": self.char_limit,
+            "carousel": self.max_carousel_items > 0,
+            "min_carousel_items": self.min_carousel_items,
+            "max_carousel_items": self.max_carousel_items,
+            "threads": self.supports_threads,
+            "accounts": self.supports_accounts,
+            "posts_per_window": posts_per_window,
+            "rate_window_seconds": window_seconds,
+        }
+
+    def validate(
+        self,
+        content: str,
+        media_url: Optional[str] = None,
+        media_urls: Optional[List[str]] = None,
+        thread_parts: Optional[List[str]] = None,
+    ) -> Optional[str]:
+        """
+        Check a post against the platform's limits
+
+        Returns:
+            What is wrong with the post, or None if it can be published
+        """
+        platform_name = self.name.capitalize()
+        if len(content) > self.char_limit:
+            return f"Content too long for {platform_name}."
+        if (media_urls and not self.max_carousel_items) or (thread_parts and not self.supports_threads):
+            return f"Carousels and threads are not supported for {platform_name}."
+        if media_urls:
+            if media_url:
+                return "Use either media_url or media_urls, not both."
+            if not self.min_carousel_items <= len(media_urls) <= self.max_carousel_items:
+                return f"A carousel needs {self.min_carousel_items} to {self.max_carousel_items} media items."
+        for number, part in enumerate(thread_parts or [], start=2):
+            if not part.strip():
+                return f"Thread part {number} is empty."
+            if len(part) > self.char_limit:
+                return f"Thread part {number} is too long for {platform_name}."
+        return None
+
+    async def publish(self, request: PublishRequest, db=None) -> PublishResult:
+        """
+        Publish one post
+
+        Args:
+            request: The post; its checkpoint lets an interrupted attempt resume
+            db: AsyncSession for account lookups
+        """
+        raise NotImplementedError
+
+    async def publish_batch(
+        self, requests: List[PublishRequest], session_factory=None
+    ) -> List[Union[PublishResult, Exception]]:
+        """
+        Publish several posts, results in request order
+
+        The default loops over publish, running the posts concurrently, each on
+        its own session (sessions are not safe to share between tasks). A post
+        whose publish raised gets the exception in its place, so one failure
+        never loses the other posts' results. Adapters for APIs with a real
+        batch endpoint override this.
+        """
+        async def publish_one(request: PublishRequest) -> PublishResult:
+            if session_factory is None:
+                return await self.publish(request)
+            async with session_factory() as db:
+                return await self.publish(request, db=db)
+
+        return list(await asyncio.gather(*(publish_one(r) for r in requests), return_exceptions=True))
+
+
+class SimulatedAdapter(PlatformAdapter):
+    """Stand-in for platforms without a real integration (Twitter/X, Facebook)"""
+
+    def __init__(self, name: str, char_limit: int = DEFAULT_CHAR_LIMIT):
+        self.name = name
+        self.char_limit = char_limit
+
+    async def publish(self, request: PublishRequest, db=None) -> PublishResult:
+        logger.info(f"[{self.name.upper()}] Simulation Mode (Real API not configured for this demo).")
+        await asyncio.sleep(SIMULATED_PUBLISH_LATENCY_SECONDS)
+        return PublishResult(True, "mock_id_123")
+
+
+class LinkedInAdapter(PlatformAdapter):
+    """LinkedIn ugcPosts, text-only, with the credentials from the environment"""
+
+    name = "linkedin"
+    char_limit = 3000
+
+    async def publish(self, request: PublishRequest, db=None) -> PublishResult:
+        platform = self.name
+        content = request.content
+        checkpoint = request.checkpoint or PublishCheckpoint()
+        limiter = get_rate_limiter()
+
+        if request.account_id is not None:
+            # Only the environment identity can publish; never post as it on another account's behalf
+            msg = f"Posting as connected account {request.account_id} is not supported for LinkedIn."
+            logger.error(f"[{platform.upper()}] ERROR: {msg}")
+            return PublishResult(False, None, msg)
+
+        token = os.getenv('LINKEDIN_ACCESS_TOKEN')
+        person_urn = os.getenv('LINKEDIN_PERSON_URN')
+        
+        if not token or not person_urn:
+            msg = "Missing credentials. LinkedIN Token or Person URN not set."
+            logger.error(f"[{platform.upper()}] ERROR: {msg}")
+            return PublishResult(False, None, msg)
+
+        # ugcPosts has no idempotency key: an attempt that died mid-request may or may
+        # not have created the share, so never resend it blindly
+        if checkpoint.state.get("in_flight"):
+            msg = (
+                f"A previous publish attempt (started {checkpoint.state.get('started_at')}) was interrupted "
+                "or got no definite answer; its outcome is unknown. Check LinkedIn before retrying."
+            )
+            logger.error(f"[{platform.upper()}] {msg}")
+            return PublishResult(False, None, msg)
+
+        delay = limiter.acquire(platform, person_urn)
+        if delay:
+            return _deferred(platform, person_urn, delay)
+
+        url = f'{LINKEDIN_API_BASE_URL}/v2/ugcPosts'
+        headers = {
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json',
+            'X-Restli-Protocol-Version': '2.0.0'
+        }
+        
+        # Construct simplified text-only payload for MVP
+        payload = {
+            "author": f"urn:li:person:{person_urn}",
+            "lifecycleState": "PUBLISHED",
+            "specificContent": {
+                "com.linkedin.ugc.ShareContent": {
+                    "shareCommentary": {
+                        "text": content
+                    },
+                    "shareMediaCategory": "NONE"
+                }
+            },
+            "visibility": {
+                "com.linkedin.ugc.MemberNetworkVisibility": "PUBLIC"
+            }
+        }
+
+        client = get_client('linkedin')
+        await checkpoint.save({"in_flight": True, "started_at": datetime.now(timezone.utc).isoformat()})
+        try:
+            response = await client.post(url, json=payload, headers=headers)
+            rejected = 400 <= response.status_code < 500
+            if rejected:
+                # A definite rejection: nothing was created, a retry is safe. A 5xx is
+                # ambiguous (the share may exist), so the in-flight marker stays
+                await checkpoint.save(None)
+            blocked_for = limiter.observe(platform, person_urn, response.status_code, response.headers)
+            if response.status_code in [201, 200]:
+                post_id = response.json().get('id')
+                logger.info(f"[{platform.upper()}] SUCCESS: Posted to LinkedIn. ID: {post_id}")
+                return PublishResult(True, post_id)
+            elif response.status_code == 429:
+                return _deferred(platform, person_urn, blocked_for or RATE_LIMIT_DEFAULT_BACKOFF_SECONDS, f"HTTP 429: {response.text}", 429)
+            else:
+                logger.error(f"[{platform.upper()}] FAILED: {response.text}")
+                if rejected:
+                    limiter.refund(platform, person_urn)
+                return PublishResult(False, None, response.text, response.status_code)
+        except LeaseLost:
+            raise
+        except Exception as e:
+            logger.error(f"[{platform.upper()}] ERROR: {e}")
+            # Only a request that never left is known not to have created the share;
+            # on a timeout or dropped response the marker and the quota charge stay
+            if isinstance(e, REQUEST_NOT_SENT_ERRORS):
+                limiter.refund(platform, person_urn)
+                await checkpoint.save(None)
+            return PublishResult(False, None, str(e), transient=is_transient_exception(e))
+
+
+class ThreadsAdapter(PlatformAdapter):
+    """Official Threads API with OAuth: single posts, carousels and reply chains"""
+
+    name = "threads"
+    char_limit = 500
+    min_carousel_items = 2
+    max_carousel_items = 20
+    supports_threads = True
+    supports_accounts = True
+
+    async def publish(self, request: PublishRequest, db=None) -> PublishResult:
+        platform = self.name
+        content, media_url, media_urls, thread_parts, account_id, checkpoint = request
+        checkpoint = checkpoint or PublishCheckpoint()
+        limiter = get_rate_limiter()
+
+        access_token = None
+        username = None
+        token_cache = get_token_cache()
+
+        # 1. The post's own account, else the default account: decrypted-token cache, then the Database (Priority)
+        try:
+            account = await _threads_account(db, account_id)
+        except SQLAlchemyError as e:
+            # e.g. a locked database: retry later rather than fail the post as unconnected
+            msg = f"Could not look up the Threads account: {e}"
+            logger.error(f"[{platform.upper()}] ERROR: {msg}")
+            return PublishResult(False, None, msg, transient=True)
+        if account is not None:
+            access_token, username, account_id = account
+        elif account_id is not None:
+            # A post bound to an account never silently publishes as someone else
+            msg = f"Threads account {account_id} is not connected (or has no access token)"
+            logger.error(f"[{platform.upper()}] ERROR: {msg}")
+            return PublishResult(False, None, msg)
+
+        # 2. Fallback to Environment Variable
+        if not access_token and os.getenv("THREADS_ACCESS_TOKEN"):
+            access_token = os.getenv("THREADS_ACCESS_TOKEN")
+            username = os.getenv("THREADS_USERNAME", "env_user")
+            logger.info(f"[{platform.upper()}] Using token from Environment Variables (Fallback) for @{username}")
+
+        if not access_token:
+            msg = "No access token found (checked Env Var & DB)"
+            logger.error(f"[{platform.upper()}] ERROR: {msg}")
+            return PublishResult(False, None, msg)
+
+        # Progress recorded by an earlier attempt (crash, media still processing, a reply chain
+        # cut short) is resumed. The post is counted against the quota once: the checkpoint
+        # records the charge together with the container it paid for
+        charged_now = not _quota_charged(checkpoint.state)
+        if charged_now:
+            # Quota is per Threads profile
+            delay = limiter.acquire(platform, username)
+            if delay:
+                return _deferred(platform, username, delay)
+
+        try:
+            # Initialize API service
+            logger.info(f"[{platform.upper()}] Using connected account: @{username}")
+            
+            # Initialize API service on the shared Threads connection pool; every
+            # response's quota headers are fed to the account's rate-limit bucket
+            api = ThreadsAPIService(
+                access_token,
+                client=get_client('threads'),
+                on_response=lambda r: limiter.observe(platform, username, r.status_code, r.headers),
+            )
+
+            root_id = checkpoint.state.get("post_id")
+            if root_id is None:
+                media_type = ThreadsAPIService.media_type_for(media_url) if media_url else "TEXT"
+                
+                # Create post via API; the container id is checkpointed before it is published
+                result = await api.create_post(
+                    content, media_url, media_type,
+                    container_id=checkpoint.state.get("container_id"),
+                    on_container=lambda cid: checkpoint.save({
+                        "container_id": cid, "created_at": datetime.now(timezone.utc).isoformat(), "polls": 0,
+                        "charged": True,
+                    }),
+                    media_urls=media_urls,
+                )
+
+                if result.get("processing"):
+                    # Release the worker slot: the scheduler brings the post back when it's time to re-check
+                    state = dict(checkpoint.state, container_id=result["container_id"])
+                    created_at = datetime.fromisoformat(state.get("created_at") or datetime.now(timezone.utc).isoformat())
+                    waited = (datetime.now(timezone.utc) - created_at).total_seconds()
+                    if waited > CONTAINER_MAX_WAIT_SECONDS:
+                        # Drop the stuck container but keep the charge, so the retry doesn't pay twice
+                        await checkpoint.save({"charged": True})
+                        msg = f"Media was still processing after {waited / 60:.0f} minutes (container {state['container_id']})"
+                        logger.error(f"[{platform.upper()}] ✗ {msg}")
+                        return PublishResult(False, None, msg, transient=True)
+                    polls = state.get("polls", 0)
+                    state["polls"] = polls + 1
+                    await checkpoint.save(state)
+                    delay = ThreadsAPIService.container_poll_delay(polls)
+                    logger.info(f"[{platform.upper()}] Container {state['container_id']} still processing; re-checking in {delay:.0f}s")
+                    return PublishResult(False, None, f"Waiting for Threads to process media (check {polls + 1})", retry_after=delay)
+                
+                if not result["success"]:
+                    # Refund this attempt's charge only if no container was created with it
+                    refund = charged_now and not _quota_charged(checkpoint.state)
+                    return _threads_failure(platform, username, api, result, refund=refund)
+
+                root_id = result.get('post_id')
+                if result.get("already_published"):
+                    logger.info(f"[{platform.upper()}] Container was already published by an earlier attempt; not republishing.")
+                    if thread_parts:
+                        msg = ("The first part was published by an interrupted attempt but its id was not recorded, "
+                               "so the replies could not be attached. Post them manually.")
+                        logger.error(f"[{platform.upper()}] ✗ {msg}")
+                        return PublishResult(False, None, msg)
+                else:
+                    logger.info(f"[{platform.upper()}] ✓ Successfully posted! ID: {root_id}")
+                if thread_parts:
+                    await checkpoint.save({"post_id": root_id, "reply_to_id": root_id, "parts_done": 0})
+
+            if thread_parts:
+                failure = await _post_thread_replies(platform, username, api, checkpoint, thread_parts)
+                if failure is not None:
+                    return failure
+                
+            # Update last_used_at ONLY if account exists in DB (written in batches by the publisher)
+            if account_id:
+                token_cache.mark_used(account_id)
+            
+            return PublishResult(True, root_id)
+                
+        except LeaseLost:
+            raise
+        except Exception as e:
+            logger.error(f"[{platform.upper()}] ERROR: {e}")
+            if charged_now and not _quota_charged(checkpoint.state):
+                limiter.refund(platform, username)
+            return PublishResult(False, None, str(e), transient=is_transient_exception(e))
+
+
+# ============================================================
+# Registry
+# ============================================================
+
+_adapters: Dict[str, PlatformAdapter] = {}
+
+
+def register_adapter(adapter: PlatformAdapter):
+    """Add or replace the adapter for `adapter.name` (plugin modules call this on import)"""
+    _adapters[adapter.name] = adapter
+
+
+def load_adapters() -> Dict[str, PlatformAdapter]:
+    """Register the built-in adapters and import PLATFORM_ADAPTER_MODULES (once; called at startup)"""
+    if _adapters:
+        return _adapters
+    for adapter in (
+        ThreadsAdapter(),
+        LinkedInAdapter(),
+        SimulatedAdapter("twitter", 280),
+        SimulatedAdapter("facebook", 63206),
+    ):
+        register_adapter(adapter)
+    for module in PLATFORM_ADAPTER_MODULES:
+        importlib.import_module(module)
+    logger.info(f"[ADAPTERS] Loaded: {', '.join(sorted(_adapters))}")
+    return _adapters
+
+
+def get_adapter(platform: str) -> PlatformAdapter:
+    """The platform's adapter; platforms without one get a simulated adapter"""
+    adapter = load_adapters().get(platform)
+    if adapter is None:
+        adapter = SimulatedAdapter(platform)
+    return adapter
+
+
+def list_adapters() -> List[PlatformAdapter]:
+    """Registered adapters, by platform name"""
+    return [adapter for _, adapter in sorted(load_adapters().items())]
@@ -0,0 +1,106 @@
+"""
+Post Event Broadcaster
+Fans post status changes out to Server-Sent Events subscribers without ever blocking the publisher
+"""
+
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber before it is considered too slow and dropped
+POST_EVENTS_QUEUE_SIZE = int(os.getenv("POST_EVENTS_QUEUE_SIZE", "256"))
+# Comment line sent on idle connections so proxies don't time them out
+POST_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("POST_EVENTS_KEEPALIVE_SECONDS", "15"))
+
+
+class Subscriber:
+    """One connected client: a bounded queue plus a dropped flag"""
+
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+
+class PostEventBroadcaster:
+    """In-process pub/sub for post events"""
+
+    def __init__(self, queue_size: int = POST_EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscriber] = set()
+        self.dropped_total = 0
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event_type: str, data: Dict[str, Any]):
+        """
+        Queue an event for every subscriber; never awaits
+
+        A subscriber whose queue is full is dropped: its stream sends a
+        `reset` event and closes, and the client resyncs over HTTP.
+        """
+        if not self._subscribers:
+            return
+        message = (event_type, json.dumps(data, default=_json_default))
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                subscriber.dropped = True
+                self._subscribers.discard(subscriber)
+                self.dropped_total += 1
+
+    async def stream(self, subscriber: Subscriber) -> AsyncIterator[str]:
+        """Render a subscriber's queue as an SSE byte stream"""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event_type, payload = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=POST_EVENTS_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    if subscriber.dropped:
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if subscriber.dropped and subscriber.queue.empty():
+                    # Deliver what was buffered, then tell the client it missed events
+                    yield f"event: {event_type}\ndata: {payload}\n\n"
+                    yield "event: reset\ndata: {}\n\n"
+                    break
+                yield f"event: {event_type}\ndata: {payload}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+# Global instance
+_broadcaster: Optional[PostEventBroadcaster] = None
+
+def get_broadcaster() -> PostEventBroadcaster:
+    """Get or create the global broadcaster"""
+    global _broadcaster
+    if _broadcaster is None:
+        _broadcaster = PostEventBroadcaster()
+    return _broadcaster
@@ -0,0 +1,554 @@
+"""
+Publish Engine
+Lease-based claiming and bounded-concurrency publishing of due posts
+with batched status write-back
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import update, select, or_
+
+from integration_service import send_batch_to_social, PublishResult, PublishCheckpoint, PublishRequest, LeaseLost
+from models import SocialPost, PostStatus, ConnectedAccount
+from token_cache import get_token_cache
+from retry_policy import MAX_PUBLISH_ATTEMPTS, is_retryable, is_transient_exception, backoff_delay
+from post_events import get_broadcaster
+from metrics import SCHEDULER_DUE_POSTS, record_publish_lag
+
+logger = logging.getLogger(__name__)
+
+# Concurrency caps (overridable via environment)
+PUBLISH_MAX_CONCURRENCY = int(os.getenv("PUBLISH_MAX_CONCURRENCY", "20"))
+PUBLISH_DEFAULT_PLATFORM_CONCURRENCY = int(os.getenv("PUBLISH_DEFAULT_PLATFORM_CONCURRENCY", "10"))
+PUBLISH_PLATFORM_CONCURRENCY = {
+    "threads": int(os.getenv("PUBLISH_THREADS_CONCURRENCY", "5")),
+    "linkedin": int(os.getenv("PUBLISH_LINKEDIN_CONCURRENCY", "5")),
+}
+# In-flight cap per connected account, so one busy account can't take every platform slot
+PUBLISH_ACCOUNT_CONCURRENCY = int(os.getenv("PUBLISH_ACCOUNT_CONCURRENCY", "2"))
+PUBLISH_STATUS_BATCH_SIZE = int(os.getenv("PUBLISH_STATUS_BATCH_SIZE", "50"))
+
+# Claiming: how many due posts one worker takes at a time and how long it owns them
+PUBLISH_CLAIM_BATCH_SIZE = int(os.getenv("PUBLISH_CLAIM_BATCH_SIZE", "500"))
+PUBLISH_LEASE_SECONDS = int(os.getenv("PUBLISH_LEASE_SECONDS", "600"))
+# Heartbeat that extends the lease on claimed posts still waiting for a lane, so a
+# large batch outliving one lease is never reclaimed (and republished) by another worker
+PUBLISH_LEASE_RENEW_SECONDS = float(os.getenv("PUBLISH_LEASE_RENEW_SECONDS", str(PUBLISH_LEASE_SECONDS / 3)))
+
+# Unique per process so every uvicorn worker / replica holds its own leases
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def claim_due_posts(
+    session_factory,
+    worker_id: str,
+    limit: int = PUBLISH_CLAIM_BATCH_SIZE,
+    lease_seconds: int = PUBLISH_LEASE_SECONDS,
+) -> list:
+    """
+    Atomically lease up to `limit` due posts to `worker_id`
+
+    A single UPDATE ... RETURNING both selects and stamps the rows, so two
+    workers can never claim the same post. On PostgreSQL the candidate rows
+    are taken FOR UPDATE SKIP LOCKED, so concurrent claimers split the due
+    set instead of queueing behind each other (SQLite serializes writers
+    and ignores the clause). Posts whose lease has lapsed (e.g. the owning
+    worker crashed) are claimable again.
+
+    Returns:
+        Rows with id, platform, account_id, content, media_url, media_urls,
+        thread_parts, attempt_count, publish_state and due_at
+    """
+    now = datetime.now(timezone.utc)
+    claimable = (
+        SocialPost.status == PostStatus.pending,
+        SocialPost.scheduled_at <= now,
+        or_(SocialPost.lease_expires_at.is_(None), SocialPost.lease_expires_at < now),
+    )
+    due_ids = (
+        select(SocialPost.id)
+        .where(*claimable)
+        .order_by(SocialPost.scheduled_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(SocialPost)
+        # Re-check the claim conditions so a concurrent claimer's rows are skipped
+        .where(SocialPost.id.in_(due_ids), *claimable)
+        # Leasing is bookkeeping, not a change to the post: keep updated_at (ETag, since-sync) as it was
+        .values(
+            lease_owner=worker_id,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            updated_at=SocialPost.updated_at,
+        )
+        .returning(
+            SocialPost.id, SocialPost.platform, SocialPost.account_id, SocialPost.content, SocialPost.media_url,
+            SocialPost.media_urls, SocialPost.thread_parts, SocialPost.attempt_count, SocialPost.publish_state,
+            SocialPost.due_at,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    async with session_factory() as session:
+        result = await session.execute(stmt)
+        claimed = result.all()
+        await session.commit()
+    return claimed
+
+
+class PostCheckpoint(PublishCheckpoint):
+    """Publish progress for one leased post, committed to SocialPost.publish_state on every save"""
+
+    def __init__(self, session_factory, post_id: int, worker_id: str, state: Optional[dict] = None):
+        super().__init__(state)
+        self.session_factory = session_factory
+        self.post_id = post_id
+        self.worker_id = worker_id
+
+    async def save(self, state: Optional[dict]):
+        async with self.session_factory() as session:
+            result = await session.execute(
+                update(SocialPost)
+                # Only while we still hold the lease: a taken-over post must not be published by us
+                .where(SocialPost.id == self.post_id, SocialPost.lease_owner == self.worker_id)
+                .values(publish_state=state or None, updated_at=SocialPost.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        if result.rowcount != 1:
+            raise LeaseLost(f"Post {self.post_id} is no longer leased to {self.worker_id}")
+        await super().save(state)
+
+
+def interleave_by_account(jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Order jobs round-robin across (platform, account) lanes, keeping each lane's own order
+
+    Slots are handed out in task order, so without this a large backlog for one
+    account would be served before every other account's first post.
+    """
+    lanes: Dict[Any, List[Dict[str, Any]]] = {}
+    for job in jobs:
+        lanes.setdefault((job["platform"], job["account_id"]), []).append(job)
+    ordered = []
+    for round_jobs in itertools.zip_longest(*lanes.values()):
+        ordered.extend(job for job in round_jobs if job is not None)
+    return ordered
+
+
+class BatchLeases:
+    """Lease state of one claimed batch, kept current by the heartbeat so dispatch never queries it"""
+
+    def __init__(self, post_ids, lease_seconds: int):
+        # Ids still leased to us: dropped once their update is written
+        self.outstanding: Set[int] = set(post_ids)
+        # Ids a renewal found no longer leased to us
+        self.lost: Set[int] = set()
+        self.lease_seconds = lease_seconds
+        # Monotonic time the leases are known to hold until (the claim just ran)
+        self.valid_until = time.monotonic() + lease_seconds
+
+    def renewed(self, renewed_at: float, lost_ids: List[int]):
+        self.valid_until = renewed_at + self.lease_seconds
+        self.lost.update(lost_ids)
+        self.outstanding.difference_update(lost_ids)
+
+    def safe_to_dispatch(self, margin: float) -> bool:
+        """True while at least `margin` seconds of the lease are known to remain"""
+        return time.monotonic() + margin < self.valid_until
+
+
+class AdapterBatcher:
+    """
+    Sends the posts dispatched to one platform at the same moment as one publish_batch call
+
+    Posts still take their account, platform and global slots one by one;
+    those that get them together (the start of a pass, or slots freed as
+    posts finish) are coalesced into a batch for the platform's adapter.
+    """
+
+    def __init__(self, platform: str, batch_sender, session_factory):
+        self.platform = platform
+        self.batch_sender = batch_sender
+        self.session_factory = session_factory
+        self._waiting: List[Any] = []
+        self._sending: Set[asyncio.Task] = set()
+
+    async def submit(self, request: PublishRequest) -> PublishResult:
+        """Queue `request` for the next batch; raises whatever its publish raised"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._waiting:
+            # Posts that get their slots in this loop iteration join the same batch
+            loop.call_soon(self._send_waiting)
+        self._waiting.append((request, future))
+        return await future
+
+    def _send_waiting(self):
+        batch, self._waiting = self._waiting, []
+        task = asyncio.create_task(self._send(batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: List[Any]):
+        try:
+            results = await self.batch_sender(
+                self.platform, [request for request, _ in batch], session_factory=self.session_factory
+            )
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def close(self):
+        """Cancel batches still being sent (only left when the pass itself was cancelled)"""
+        for task in list(self._sending):
+            task.cancel()
+        await asyncio.gather(*self._sending, return_exceptions=True)
+
+
+class PublishEngine:
+    """Publishes due posts in parallel, capped globally, per platform and per account"""
+
+    def __init__(
+        self,
+        session_factory,
+        max_concurrency: int = PUBLISH_MAX_CONCURRENCY,
+        platform_concurrency: Optional[Dict[str, int]] = None,
+        default_platform_concurrency: int = PUBLISH_DEFAULT_PLATFORM_CONCURRENCY,
+        batch_size: int = PUBLISH_STATUS_BATCH_SIZE,
+        batch_sender=send_batch_to_social,
+        worker_id: str = WORKER_ID,
+        claim_batch_size: int = PUBLISH_CLAIM_BATCH_SIZE,
+        on_reschedule: Optional[Callable[[int, datetime], None]] = None,
+        account_concurrency: int = PUBLISH_ACCOUNT_CONCURRENCY,
+        lease_seconds: int = PUBLISH_LEASE_SECONDS,
+        lease_renew_seconds: float = PUBLISH_LEASE_RENEW_SECONDS,
+    ):
+        """
+        Initialize the publish engine
+
+        Args:
+            session_factory: Callable returning an AsyncSession context manager
+            max_concurrency: Maximum publishes in flight across all platforms
+            platform_concurrency: Per-platform in-flight caps
+            default_platform_concurrency: Cap for platforms not listed above
+            batch_size: Number of status updates written per commit
+            batch_sender: Coroutine with the send_batch_to_social signature
+            worker_id: Lease owner recorded on claimed posts
+            claim_batch_size: Maximum posts claimed per round
+            on_reschedule: Called with (post_id, scheduled_at) for posts deferred or queued for retry
+            account_concurrency: In-flight cap per (platform, account) lane
+            lease_seconds: How long a claim (or renewal) owns a post
+            lease_renew_seconds: Interval between lease renewals for posts not yet finished
+        """
+        self.session_factory = session_factory
+        self.worker_id = worker_id
+        self.claim_batch_size = claim_batch_size
+        self.lease_seconds = lease_seconds
+        self.lease_renew_seconds = lease_renew_seconds
+        self.batch_size = max(1, batch_size)
+        self.batch_sender = batch_sender
+        self.on_reschedule = on_reschedule
+        self._max_concurrency = max_concurrency
+        # Semaphores are created lazily so they bind to the running event loop
+        self._global_slots: Optional[asyncio.Semaphore] = None
+        self._platform_concurrency = dict(PUBLISH_PLATFORM_CONCURRENCY if platform_concurrency is None else platform_concurrency)
+        self._default_platform_concurrency = default_platform_concurrency
+        self._platform_slots: Dict[str, asyncio.Semaphore] = {}
+        self._account_concurrency = account_concurrency
+        self._account_slots: Dict[Any, asyncio.Semaphore] = {}
+
+    def _slots_for(self, platform: str) -> asyncio.Semaphore:
+        slots = self._platform_slots.get(platform)
+        if slots is None:
+            limit = self._platform_concurrency.get(platform, self._default_platform_concurrency)
+            slots = asyncio.Semaphore(limit)
+            self._platform_slots[platform] = slots
+        return slots
+
+    def _lane_for(self, platform: str, account_id: Optional[int]) -> asyncio.Semaphore:
+        """Per-account slots (account None is the platform's default account)"""
+        key = (platform, account_id)
+        slots = self._account_slots.get(key)
+        if slots is None:
+            slots = asyncio.Semaphore(self._account_concurrency)
+            self._account_slots[key] = slots
+        return slots
+
+    async def publish_due(self) -> int:
+        """
+        Claim and publish due posts until none are left for this worker
+
+        Returns:
+            Number of posts published successfully
+        """
+        published = 0
+        due = 0
+        while True:
+            claimed = await claim_due_posts(
+                self.session_factory, self.worker_id, self.claim_batch_size, self.lease_seconds
+            )
+            if not claimed:
+                break
+            due += len(claimed)
+            logger.info(f"[PUBLISHER] {self.worker_id} claimed {len(claimed)} due posts.")
+            published += await self.publish(claimed)
+            if len(claimed) < self.claim_batch_size:
+                break
+        SCHEDULER_DUE_POSTS.observe(due)
+        return published
+
+    async def publish(self, posts: List[SocialPost]) -> int:
+        """
+        Publish a batch of posts concurrently
+
+        Args:
+            posts: Posts leased to this worker (ORM objects or rows, only attributes are read)
+
+        Returns:
+            Number of posts published successfully
+        """
+        # Snapshot the fields we need so tasks never touch shared ORM state
+        jobs = [
+            {
+                "id": p.id, "platform": p.platform, "account_id": getattr(p, "account_id", None),
+                "content": p.content, "media_url": p.media_url,
+                "media_urls": getattr(p, "media_urls", None), "thread_parts": getattr(p, "thread_parts", None),
+                "attempt_count": getattr(p, "attempt_count", 0) or 0,
+                "publish_state": getattr(p, "publish_state", None),
+                "due_at": getattr(p, "due_at", None),
+            }
+            for p in posts
+        ]
+        if not jobs:
+            return 0
+        if self._global_slots is None:
+            self._global_slots = asyncio.Semaphore(self._max_concurrency)
+
+        leases = BatchLeases((job["id"] for job in jobs), self.lease_seconds)
+        heartbeat = asyncio.create_task(self._renew_leases(leases))
+        # One batcher per platform adapter, so posts are dispatched in batches per adapter
+        batchers = {
+            platform: AdapterBatcher(platform, self.batch_sender, self.session_factory)
+            for platform in {job["platform"] for job in jobs}
+        }
+        tasks = [asyncio.create_task(self._run_job(job, leases, batchers)) for job in interleave_by_account(jobs)]
+        pending_updates: List[Dict[str, Any]] = []
+        published = 0
+        requeued = 0
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if result is None:
+                    continue
+                if result["status"] == PostStatus.published:
+                    published += 1
+                elif result["status"] == PostStatus.pending:
+                    requeued += 1
+                pending_updates.append(result)
+                if len(pending_updates) >= self.batch_size:
+                    flushing, pending_updates = pending_updates, []
+                    await self._flush(flushing)
+                    leases.outstanding.difference_update(u["id"] for u in flushing)
+        finally:
+            # No task outlives the pass (only reachable early if publish() itself is cancelled),
+            # and whatever finished is written back either way
+            heartbeat.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(heartbeat, *tasks, return_exceptions=True)
+            for batcher in batchers.values():
+                await batcher.close()
+            if pending_updates:
+                await self._flush(pending_updates)
+
+        logger.info(f"[PUBLISHER] Batch complete: {published}/{len(jobs)} published, {requeued} deferred or retrying.")
+        return published
+
+    async def _renew_leases(self, leases: BatchLeases):
+        """
+        Push the lease deadline out for the batch's outstanding posts every lease_renew_seconds, until cancelled
+
+        The renewal doubles as the ownership check: posts it no longer finds
+        leased to us are marked lost, so dispatch never has to query the lease.
+        """
+        while True:
+            await asyncio.sleep(self.lease_renew_seconds)
+            ids = list(leases.outstanding)
+            if not ids:
+                continue
+            renewed_at = time.monotonic()
+            try:
+                async with self.session_factory() as session:
+                    result = await session.execute(
+                        update(SocialPost)
+                        .where(SocialPost.id.in_(ids), SocialPost.lease_owner == self.worker_id)
+                        .values(
+                            lease_expires_at=datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds),
+                            updated_at=SocialPost.updated_at,
+                        )
+                        .returning(SocialPost.id)
+                        .execution_options(synchronize_session=False)
+                    )
+                    still_ours = set(result.scalars().all())
+                    await session.commit()
+            except Exception as e:
+                # The next beat retries; until one succeeds, posts stop being dispatched as the lease runs low
+                logger.warning(f"[PUBLISHER] Lease renewal failed: {e}")
+                continue
+            leases.renewed(renewed_at, [post_id for post_id in ids if post_id not in still_ours])
+            logger.debug(f"[PUBLISHER] Renewed leases on {len(still_ours)}/{len(ids)} posts.")
+
+    async def _run_job(
+        self, job: Dict[str, Any], leases: BatchLeases, batchers: Dict[str, AdapterBatcher]
+    ) -> Optional[Dict[str, Any]]:
+        """_publish_one that never raises, so one post's failure can't drop the rest of the batch's write-back"""
+        try:
+            return await self._publish_one(job, leases, batchers[job["platform"]])
+        except Exception as e:
+            # Left pending under our lease, so it is reclaimed once the lease lapses
+            logger.error(f"[PUBLISHER] Unexpected error handling post {job['id']}: {e}")
+            return None
+
+    async def _publish_one(
+        self, job: Dict[str, Any], leases: BatchLeases, batcher: AdapterBatcher
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Publish a single post through its adapter's batcher, holding a platform slot and a global slot
+
+        Returns:
+            The row update to write, or None if the lease was (or may have been) lost
+        """
+        checkpoint = PostCheckpoint(self.session_factory, job["id"], self.worker_id, job["publish_state"])
+        # Take the narrowest slot first (account, then platform) so a saturated
+        # account or platform never pins wider slots other lanes could use
+        async with self._lane_for(job["platform"], job["account_id"]), self._slots_for(job["platform"]):
+            async with self._global_slots:
+                if job["id"] in leases.lost:
+                    logger.warning(f"[PUBLISHER] Post {job['id']} is no longer leased to {self.worker_id}; skipping it.")
+                    return None
+                if not leases.safe_to_dispatch(min(self.lease_renew_seconds, self.lease_seconds / 2)):
+                    # Lease unknown (renewals failing): the post stays pending and is reclaimed once the lease lapses
+                    logger.warning(f"[PUBLISHER] Lease on post {job['id']} could not be renewed; skipping it.")
+                    return None
+                try:
+                    result = await batcher.submit(PublishRequest(
+                        job["content"], job["media_url"], job["media_urls"], job["thread_parts"],
+                        job["account_id"], checkpoint,
+                    ))
+                except LeaseLost as e:
+                    logger.warning(f"[PUBLISHER] {e}; leaving it to its new owner.")
+                    return None
+                except Exception as e:
+                    logger.error(f"[PUBLISHER] Error publishing post {job['id']}: {e}")
+                    result = PublishResult(False, None, str(e), transient=is_transient_exception(e))
+
+        now = datetime.now(timezone.utc)
+        change = {
+            "id": job["id"],
+            "external_post_id": result.post_id,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "next_attempt_at": None,
+            "updated_at": now,
+        }
+        # A local quota deferral never reached the platform, so it doesn't use up an attempt
+        local_deferral = result.retry_after is not None and result.status_code is None and not result.transient
+        attempt = job["attempt_count"] + (0 if local_deferral else 1)
+        change["attempt_count"] = attempt
+
+        if result.success:
+            change.update(status=PostStatus.published, error_message=None, publish_state=None)
+            record_publish_lag(job["platform"], job["due_at"], now)
+            logger.info(f"[PUBLISHER] Post {job['id']} -> PUBLISHED. ID: {result.post_id}")
+        elif local_deferral:
+            # Over quota: keep the post pending and move it to when the account has capacity again
+            run_at = now + timedelta(seconds=result.retry_after)
+            change.update(
+                status=PostStatus.pending,
+                scheduled_at=run_at,
+                error_message=f"Deferred until {run_at:%Y-%m-%d %H:%M:%S} UTC: {result.error}",
+            )
+            logger.info(f"[PUBLISHER] Post {job['id']} -> DEFERRED to {run_at.isoformat()} (rate limit).")
+        elif is_retryable(result) and attempt < MAX_PUBLISH_ATTEMPTS:
+            run_at = now + timedelta(seconds=backoff_delay(attempt, result.retry_after))
+            change.update(
+                status=PostStatus.pending,
+                scheduled_at=run_at,
+                next_attempt_at=run_at,
+                error_message=f"Attempt {attempt}/{MAX_PUBLISH_ATTEMPTS} failed: {result.error}",
+            )
+            logger.warning(
+                f"[PUBLISHER] Post {job['id']} -> RETRY {attempt}/{MAX_PUBLISH_ATTEMPTS} at {run_at.isoformat()}. "
+                f"Error: {result.error}"
+            )
+        elif is_retryable(result):
+            change.update(
+                status=PostStatus.dead_letter,
+                error_message=f"Gave up after {attempt} attempts: {result.error}",
+                publish_state=None,
+            )
+            logger.error(f"[PUBLISHER] Post {job['id']} -> DEAD LETTER after {attempt} attempts. Error: {result.error}")
+        else:
+            # Keep status a plain enum value; the error text goes to its own column.
+            # publish_state is left as-is until a manual retry clears it
+            change.update(status=PostStatus.failed, error_message=result.error or "Unknown Error")
+            logger.error(f"[PUBLISHER] Post {job['id']} -> FAILED. Error: {result.error}")
+        return change
+
+    async def _flush(self, updates: List[Dict[str, Any]]):
+        """Write a batch of status updates in a single transaction, releasing the leases"""
+        async with self.session_factory() as session:
+            try:
+                # Only touch rows this worker still owns
+                await session.execute(
+                    update(SocialPost)
+                    .where(SocialPost.lease_owner == self.worker_id)
+                    .execution_options(synchronize_session=None),
+                    updates,
+                )
+                last_used = get_token_cache().drain_last_used()
+                if last_used:
+                    await session.execute(
+                        update(ConnectedAccount),
+                        [{"id": account_id, "last_used_at": used_at} for account_id, used_at in last_used.items()],
+                    )
+                await session.commit()
+            except Exception as e:
+                logger.error(f"[PUBLISHER] Failed to write {len(updates)} status updates: {e}")
+                await session.rollback()
+                return
+
+        # Push the transitions to live dashboards once they are durable
+        broadcaster = get_broadcaster()
+        for change in updates:
+            if "scheduled_at" in change and self.on_reschedule is not None:
+                self.on_reschedule(change["id"], change["scheduled_at"])
+            broadcaster.publish("post.updated", {
+                key: change[key]
+                for key in (
+                    "id", "status", "error_message", "external_post_id",
+                    "scheduled_at", "attempt_count", "next_attempt_at", "updated_at",
+                )
+                if key in change
+            })
@@ -0,0 +1,243 @@
+"""
+Platform Rate Limiter
+Token buckets per (platform, account), corrected by the quota headers platforms send back
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Publish quotas: (posts allowed, window in seconds) per account
+RATE_LIMITS = {
+    # Threads allows 250 API-published posts per profile per rolling 24 hours
+    "threads": (int(os.getenv("THREADS_POSTS_PER_DAY", "250")), 24 * 3600),
+    # LinkedIn's member share limit; it answers bursts beyond it with 429s
+    "linkedin": (int(os.getenv("LINKEDIN_POSTS_PER_DAY", "150")), 24 * 3600),
+}
+# Back-off applied to a 429 that carries no Retry-After or reset header
+RATE_LIMIT_DEFAULT_BACKOFF_SECONDS = float(os.getenv("RATE_LIMIT_DEFAULT_BACKOFF_SECONDS", "60"))
+
+
+class TokenBucket:
+    """Continuously refilling bucket; a platform-imposed block overrides the local count"""
+
+    __slots__ = ("capacity", "refill_per_second", "tokens", "updated", "blocked_until", "remaining", "reset_at")
+
+    def __init__(self, capacity: int, window_seconds: float):
+        self.capacity = float(capacity)
+        self.refill_per_second = capacity / window_seconds
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # monotonic
+        # Last quota reported by the platform, if it reports one
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[datetime] = None
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def try_acquire(self) -> float:
+        """
+        Take one token
+
+        Returns:
+            0 if a token was taken, otherwise seconds until one is available
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.refill_per_second
+
+    def refund(self):
+        """Return a token for a request the platform did not count"""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def block(self, seconds: float):
+        """Stop handing out tokens for `seconds` (never shortens an existing block)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def blocked_for(self) -> float:
+        return max(0.0, self.blocked_until - time.monotonic())
+
+    def level(self) -> float:
+        self._refill(time.monotonic())
+        return self.tokens
+
+
+class RateLimiter:
+    """Registry of token buckets keyed by (platform, account)"""
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[int, float]]] = None):
+        self.limits = dict(RATE_LIMITS if limits is None else limits)
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+
+    def _bucket(self, platform: str, account: str) -> Optional[TokenBucket]:
+        if platform not in self.limits:
+            return None
+        key = (platform, account)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            capacity, window = self.limits[platform]
+            bucket = TokenBucket(capacity, window)
+            self._buckets[key] = bucket
+        return bucket
+
+    def acquire(self, platform: str, account: str) -> float:
+        """
+        Reserve one publish for an account
+
+        Returns:
+            0 to go ahead, otherwise seconds the publish should be deferred
+        """
+        bucket = self._bucket(platform, account)
+        if bucket is None:
+            return 0.0
+        delay = bucket.try_acquire()
+        if delay:
+            logger.info(f"[RATE LIMIT] {platform}/{account} exhausted; next slot in {delay:.0f}s")
+        return delay
+
+    def refund(self, platform: str, account: str):
+        """Give back a reserved publish that failed without reaching the quota"""
+        bucket = self._bucket(platform, account)
+        if bucket is not None:
+            bucket.refund()
+
+    def blocked_for(self, platform: str, account: str) -> float:
+        """Seconds until the platform accepts requests for this account again"""
+        bucket = self._buckets.get((platform, account))
+        return bucket.blocked_for() if bucket is not None else 0.0
+
+    def observe(self, platform: str, account: str, status_code: int, headers: Mapping[str, str]) -> float:
+        """
+        Fold a platform response into the account's bucket
+
+        Honors Retry-After, X-RateLimit-Remaining/-Reset and Meta's
+        X-Business-Use-Case-Usage / X-App-Usage headers.
+
+        Returns:
+            Seconds the account is now blocked for (0 if not blocked)
+        """
+        bucket = self._bucket(platform, account)
+        if bucket is None:
+            return 0.0
+
+        remaining = _parse_int(headers.get("x-ratelimit-remaining"))
+        reset_after = _parse_reset(headers.get("x-ratelimit-reset"))
+        if remaining is not None:
+            bucket.remaining = remaining
+            bucket.tokens = min(bucket.tokens, float(remaining))
+            if remaining <= 0 and reset_after:
+                bucket.block(reset_after)
+        if reset_after is not None:
+            bucket.reset_at = datetime.fromtimestamp(time.time() + reset_after, timezone.utc)
+
+        regain_after = _meta_regain_seconds(headers)
+        if regain_after:
+            bucket.block(regain_after)
+
+        if status_code == 429:
+            retry_after = _parse_retry_after(headers.get("retry-after"))
+            if retry_after is None:
+                retry_after = reset_after or regain_after or RATE_LIMIT_DEFAULT_BACKOFF_SECONDS
+            bucket.block(retry_after)
+            logger.warning(f"[RATE LIMIT] {platform}/{account} throttled by platform for {retry_after:.0f}s")
+
+        return bucket.blocked_for()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Current level of every bucket, for the rate-limit API"""
+        return [
+            {
+                "platform": platform,
+                "account": account,
+                "tokens": round(bucket.level(), 2),
+                "capacity": int(bucket.capacity),
+                "refill_per_hour": round(bucket.refill_per_second * 3600, 2),
+                "blocked_for_seconds": round(bucket.blocked_for(), 1),
+                "platform_remaining": bucket.remaining,
+                "platform_reset_at": bucket.reset_at,
+            }
+            for (platform, account), bucket in sorted(self._buckets.items())
+        ]
+
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """X-RateLimit-Reset as seconds from now (accepts a delta or an epoch timestamp)"""
+    reset = _parse_int(value)
+    if reset is None:
+        return None
+    if reset > 1_000_000_000:
+        return max(0.0, reset - time.time())
+    return float(max(0, reset))
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After as seconds (accepts delta-seconds or an HTTP-date)"""
+    if not value:
+        return None
+    seconds = _parse_int(value)
+    if seconds is not None:
+        return float(max(0, seconds))
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def _meta_regain_seconds(headers: Mapping[str, str]) -> float:
+    """Block time from Meta usage headers (estimated_time_to_regain_access is in minutes)"""
+    raw = headers.get("x-business-use-case-usage")
+    if raw:
+        try:
+            usage = json.loads(raw)
+            minutes = max(
+                (entry.get("estimated_time_to_regain_access", 0) or 0
+                 for entries in usage.values() for entry in entries),
+                default=0,
+            )
+            if minutes:
+                return float(minutes) * 60
+        except (ValueError, AttributeError, TypeError):
+            pass
+    raw = headers.get("x-app-usage")
+    if raw:
+        try:
+            usage = json.loads(raw)
+            if max((v for v in usage.values() if isinstance(v, (int, float))), default=0) >= 100:
+                return RATE_LIMIT_DEFAULT_BACKOFF_SECONDS
+        except (ValueError, AttributeError):
+            pass
+    return 0.0
+
+
+# Global instance
+_rate_limiter: Optional[RateLimiter] = None
+
+def get_rate_limiter() -> RateLimiter:
+    """Get or create the global rate limiter"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
@@ -0,0 +1,62 @@
+"""
+Publish Retry Policy
+Classifies publish failures as transient or permanent and spaces retries with jittered exponential backoff
+"""
+
+import asyncio
+import os
+import random
+from typing import Optional
+
+import httpx
+
+# Attempts (including the first) before a transiently failing post is dead-lettered
+MAX_PUBLISH_ATTEMPTS = int(os.getenv("MAX_PUBLISH_ATTEMPTS", "5"))
+RETRY_BASE_DELAY_SECONDS = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "30"))
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "3600"))
+
+# Request timeout, too early, rate limited, and every server-side error
+TRANSIENT_STATUS_CODES = {408, 425, 429}
+
+
+def is_transient_status(status_code: Optional[int]) -> bool:
+    """True for HTTP statuses worth retrying"""
+    if status_code is None:
+        return False
+    return status_code in TRANSIENT_STATUS_CODES or status_code >= 500
+
+
+def is_transient_exception(exc: BaseException) -> bool:
+    """True for timeouts and connection-level failures (nothing reached the platform, or no answer came back)"""
+    return isinstance(exc, (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError, ConnectionError))
+
+
+def is_retryable(result) -> bool:
+    """
+    Decide whether a failed PublishResult should be retried
+
+    Errors without an HTTP status (missing credentials, bad input) are
+    permanent unless the sender flagged them as transient.
+    """
+    return bool(result.transient) or is_transient_status(result.status_code)
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None, rng=random) -> float:
+    """
+    Seconds to wait before attempt number `attempt + 1`
+
+    Exponential in the attempt count with "equal jitter": the delay is
+    drawn from the upper half of the window, so retries of posts that
+    failed together (a platform outage) spread out instead of returning
+    as a herd, while no retry comes back almost immediately. A platform's
+    Retry-After is a floor.
+
+    Args:
+        attempt: Attempts made so far (1 after the first failure)
+        retry_after: Seconds the platform asked us to wait, if any
+    """
+    window = min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * (2 ** max(0, attempt - 1)))
+    delay = window / 2 + rng.uniform(0, window / 2)
+    if retry_after:
+        delay = max(delay, retry_after)
+    return delay
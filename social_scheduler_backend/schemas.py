@@ -1,27 +1,64 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 # Existing schemas
 class SocialPostCreate(BaseModel):
     content: str
     media_url: Optional[str] = None
+    # Threads only: carousel items (2-20) and follow-up replies forming a thread
+    media_urls: Optional[List[str]] = None
+    thread_parts: Optional[List[str]] = None
     scheduled_at: Optional[datetime] = None
     platform: str
+    # Connected account to publish as (see /api/accounts/status); omit for the platform default
+    account_id: Optional[int] = None
 
 class SocialPostResponse(BaseModel):
     id: int
     content: str
     media_url: Optional[str]
+    media_urls: Optional[List[str]] = None
+    thread_parts: Optional[List[str]] = None
     scheduled_at: datetime
     platform: str
+    account_id: Optional[int] = None
     status: str
+    error_message: Optional[str] = None
+    attempt_count: int = 0
+    next_attempt_at: Optional[datetime] = None
     created_at: datetime
     updated_at: Optional[datetime]
 
     class Config:
         from_attributes = True
 
+class PostListItem(BaseModel):
+    """Row of the paginated /posts listing; projected fields are omitted, not null"""
+    id: int
+    content: Optional[str] = None
+    media_url: Optional[str] = None
+    media_urls: Optional[List[str]] = None
+    thread_parts: Optional[List[str]] = None
+    scheduled_at: datetime
+    platform: Optional[str] = None
+    account_id: Optional[int] = None
+    status: Optional[str] = None
+    error_message: Optional[str] = None
+    external_post_id: Optional[str] = None
+    attempt_count: Optional[int] = None
+    next_attempt_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class PostsDelta(BaseModel):
+    """Incremental /posts sync: apply `deleted`, then upsert `posts`, then poll again with `cursor`"""
+    posts: list[PostListItem]
+    deleted: list[int]
+    cursor: str
+    has_more: bool = False
+    reset: bool = False  # cursor too old to replay; refetch the full listing
+
 # Aliases for backward compatibility
 PostCreate = SocialPostCreate
 PostResponse = SocialPostResponse
@@ -37,6 +74,7 @@ class ConnectAccountResponse(BaseModel):
     error: Optional[str] = None
 
 class AccountStatus(BaseModel):
+    id: int
     platform: str
     username: str
     connected_at: str
@@ -48,3 +86,28 @@ class AccountsStatusResponse(BaseModel):
 class DisconnectAccountResponse(BaseModel):
     success: bool
     error: Optional[str] = None
+
+class PlatformCapabilities(BaseModel):
+    """What a platform's adapter accepts (see /api/platforms)"""
+    platform: str
+    char_limit: int
+    carousel: bool
+    min_carousel_items: int
+    max_carousel_items: int
+    threads: bool
+    accounts: bool
+    posts_per_window: Optional[int] = None
+    rate_window_seconds: Optional[float] = None
+
+class RateLimitBucket(BaseModel):
+    platform: str
+    account: str
+    tokens: float  # publishes available right now
+    capacity: int
+    refill_per_hour: float
+    blocked_for_seconds: float  # > 0 while the platform has throttled this account
+    platform_remaining: Optional[int] = None
+    platform_reset_at: Optional[datetime] = None
+
+class RateLimitsResponse(BaseModel):
+    buckets: list[RateLimitBucket]
@@ -0,0 +1,165 @@
+"""
+Browser Session Store
+Playwright storage state kept encrypted in ConnectedAccount.session_data, cached in memory,
+so any worker or replica can post with a warm session instead of logging in again
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, update
+
+from encryption import get_encryptor
+from models import ConnectedAccount
+
+logger = logging.getLogger(__name__)
+
+# How long a cached session is trusted before re-reading it, so sessions
+# refreshed by other workers/replicas are picked up
+SESSION_CACHE_TTL_SECONDS = float(os.getenv("SESSION_CACHE_TTL_SECONDS", "300"))
+# Pre-database session files, imported on first use
+LEGACY_SESSION_DIR = Path(os.getenv("LEGACY_SESSION_DIR", "./sessions"))
+
+
+def cookie_fingerprint(storage_state: dict) -> str:
+    """Digest of the cookies in a storage state; unchanged cookies mean nothing worth saving"""
+    cookies = sorted(
+        (c.get("domain", ""), c.get("path", ""), c.get("name", ""), c.get("value", ""), c.get("expires"))
+        for c in storage_state.get("cookies", [])
+    )
+    return hashlib.sha256(json.dumps(cookies).encode()).hexdigest()
+
+
+class CachedSession:
+    """A decrypted storage state and the fingerprint of its cookies"""
+
+    __slots__ = ("storage_state", "fingerprint", "expires_at")
+
+    def __init__(self, storage_state: Optional[dict], expires_at: float):
+        self.storage_state = storage_state
+        self.fingerprint = cookie_fingerprint(storage_state) if storage_state else None
+        self.expires_at = expires_at  # monotonic deadline
+
+
+class SessionStore:
+    """Encrypted, database-backed browser sessions keyed by (platform, username)"""
+
+    def __init__(self, session_factory, ttl_seconds: float = SESSION_CACHE_TTL_SECONDS):
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self._cache: Dict[Tuple[str, str], CachedSession] = {}
+
+    def _cached(self, platform: str, username: str) -> Optional[CachedSession]:
+        entry = self._cache.get((platform, username))
+        if entry is not None and entry.expires_at <= time.monotonic():
+            del self._cache[(platform, username)]
+            entry = None
+        return entry
+
+    def _remember(self, platform: str, username: str, storage_state: Optional[dict]) -> CachedSession:
+        entry = CachedSession(storage_state, time.monotonic() + self.ttl_seconds)
+        self._cache[(platform, username)] = entry
+        return entry
+
+    async def load(self, platform: str, username: str) -> Optional[dict]:
+        """
+        Saved storage state for an account
+
+        Returns:
+            The Playwright storage state, or None if the account has no usable session
+        """
+        entry = self._cached(platform, username)
+        if entry is not None:
+            return entry.storage_state
+
+        storage_state = None
+        async with self.session_factory() as db:
+            encrypted = await db.scalar(
+                select(ConnectedAccount.session_data).where(
+                    ConnectedAccount.platform == platform,
+                    ConnectedAccount.username == username,
+                )
+            )
+        if encrypted:
+            try:
+                storage_state = json.loads(get_encryptor().decrypt(encrypted))
+            except Exception as e:
+                logger.warning(f"[SESSION STORE] Could not read session for {platform}/{username}: {e}")
+        else:
+            storage_state = await self._import_legacy_file(platform, username)
+
+        self._remember(platform, username, storage_state)
+        return storage_state
+
+    async def save(self, platform: str, username: str, storage_state: dict) -> bool:
+        """
+        Persist a storage state if its cookies differ from the stored ones
+
+        Returns:
+            True if the database was written
+        """
+        entry = self._cached(platform, username)
+        if entry is not None and entry.fingerprint == cookie_fingerprint(storage_state):
+            return False
+
+        encrypted = get_encryptor().encrypt(json.dumps(storage_state))
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(ConnectedAccount)
+                .where(ConnectedAccount.platform == platform, ConnectedAccount.username == username)
+                .values(session_data=encrypted)
+            )
+            await db.commit()
+
+        self._remember(platform, username, storage_state)
+        if result.rowcount == 0:
+            logger.warning(f"[SESSION STORE] No connected {platform} account @{username}; session kept in memory only")
+            return False
+        logger.info(f"[SESSION STORE] Saved session for {platform}/{username}")
+        return True
+
+    async def _import_legacy_file(self, platform: str, username: str) -> Optional[dict]:
+        """Move a session saved by older versions (sessions/<platform>/<user>_session.json) into the database"""
+        session_file = LEGACY_SESSION_DIR / platform / f"{username}_session.json"
+
+        def read():
+            if not session_file.exists():
+                return None
+            with open(session_file, 'r') as f:
+                return json.load(f)
+
+        try:
+            storage_state = await asyncio.to_thread(read)
+        except Exception as e:
+            logger.warning(f"[SESSION STORE] Could not read legacy session file {session_file}: {e}")
+            return None
+        if storage_state is not None:
+            logger.info(f"[SESSION STORE] Importing legacy session file for {platform}/{username}")
+            await self.save(platform, username, storage_state)
+        return storage_state
+
+    def invalidate(self, platform: str, username: Optional[str] = None):
+        """Drop cached sessions for an account, or every account on a platform"""
+        for key in [k for k in self._cache if k[0] == platform and username in (None, k[1])]:
+            del self._cache[key]
+
+    def clear(self):
+        self._cache.clear()
+
+
+# Global instance
+_session_store: Optional[SessionStore] = None
+
+def get_session_store() -> SessionStore:
+    """Get or create the global session store (backed by the app's database)"""
+    global _session_store
+    if _session_store is None:
+        from database import AsyncSessionLocal
+        _session_store = SessionStore(AsyncSessionLocal)
+    return _session_store
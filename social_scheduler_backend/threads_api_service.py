@@ -3,61 +3,162 @@ Threads API Service
 Official Meta Threads API integration for posting
 """
 
+import os
 import httpx
 import asyncio
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Media container processing: first status re-check, backoff cap, and when to give up
+CONTAINER_POLL_INITIAL_SECONDS = float(os.getenv("THREADS_CONTAINER_POLL_INITIAL_SECONDS", "10"))
+CONTAINER_POLL_MAX_SECONDS = float(os.getenv("THREADS_CONTAINER_POLL_MAX_SECONDS", "60"))
+CONTAINER_MAX_WAIT_SECONDS = float(os.getenv("THREADS_CONTAINER_MAX_WAIT_SECONDS", "1800"))
+
+# Media URLs with these extensions are sent as VIDEO, anything else as IMAGE
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v")
+
 class ThreadsAPIService:
     """Service for interacting with official Threads API"""
     
-    BASE_URL = "https://graph.threads.net/v1.0"
+    BASE_URL = os.getenv("THREADS_API_BASE_URL", "https://graph.threads.net/v1.0").rstrip("/")
     
-    def __init__(self, access_token: str):
+    def __init__(
+        self,
+        access_token: str,
+        client: Optional[httpx.AsyncClient] = None,
+        on_response: Optional[Callable[[httpx.Response], None]] = None,
+    ):
         """
         Initialize Threads API service
         
         Args:
             access_token: User's Threads access token
+            client: Shared pooled client; a private one is created (and closed) if omitted
+            on_response: Called with every API response (e.g. to feed the rate limiter)
         """
         self.access_token = access_token
-        # Use Authorization Header for better security and stability
-        headers = {
+        # Use Authorization Header for better security and stability (sent per request
+        # so a shared connection pool can serve many accounts)
+        self.headers = {
             "Authorization": f"Bearer {access_token}"
         }
-        self.client = httpx.AsyncClient(headers=headers, timeout=60.0)
+        self._owns_client = client is None
+        self.client = client or httpx.AsyncClient(timeout=60.0)
+        self.on_response = on_response
+        # Status of the most recent API response (None if the request never got one)
+        self.last_status_code: Optional[int] = None
+        # Exception raised by the most recent failed request, if it failed without a response
+        self.last_exception: Optional[Exception] = None
+
+    def _observe(self, response: httpx.Response):
+        self.last_status_code = response.status_code
+        if self.on_response is not None:
+            self.on_response(response)
+
+    @staticmethod
+    def media_type_for(media_url: str) -> str:
+        """IMAGE or VIDEO, judged by the URL's file extension"""
+        path = httpx.URL(media_url).path.lower()
+        return "VIDEO" if path.endswith(VIDEO_EXTENSIONS) else "IMAGE"
     
     async def create_post(
         self, 
         text: str, 
         media_url: Optional[str] = None,
-        media_type: str = "TEXT"
+        media_type: str = "TEXT",
+        container_id: Optional[str] = None,
+        on_container: Optional[Callable[[str], Awaitable[None]]] = None,
+        media_urls: Optional[List[str]] = None,
+        reply_to_id: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
-        Create a post on Threads
+        Create a post on Threads, without ever waiting on media processing
+        
+        Media containers are published only once their status is FINISHED.
+        While Meta is still processing one, this returns straight away with
+        `processing` set; call again later with the same `container_id` to
+        continue (see container_poll_delay for pacing).
         
         Args:
             text: Post content
             media_url: Optional media URL
-            media_type: "TEXT", "IMAGE", or "VIDEO"
+            media_type: "TEXT", "IMAGE", or "VIDEO" (ignored for carousels)
+            container_id: Continue with this existing container instead of creating one (resume)
+            on_container: Awaited with a newly created container id before it is
+                published, so the caller can checkpoint it; errors it raises abort the post
+            media_urls: Publish a carousel of these images/videos; the item
+                containers are created concurrently before the parent
+            reply_to_id: Post as a reply to this Threads media id (thread chains)
         
         Returns:
-            Dict with success status and post ID or error
+            Dict with success status and post ID or error; `processing` and
+            `container_id` while the media is not ready; `already_published`
+            when a resumed container turned out to be live
         """
-        try:
-            # Step 1: Create media container
-            container_id, error = await self._create_container(text, media_url, media_type)
+        if container_id is not None:
+            status, error = await self.get_container_status(container_id)
+            if status == "PUBLISHED":
+                logger.info(f"[THREADS API] Container {container_id} is already published")
+                return {"success": True, "post_id": None, "already_published": True}
+            if status == "ERROR":
+                return {"success": False, "error": f"Media processing failed: {error or 'unknown error'}"}
+            if status is None and self.last_status_code not in (400, 404):
+                # Couldn't tell what happened to it; don't risk a duplicate by starting over
+                return {"success": False, "error": error, "status_code": self.last_status_code}
+            if status in ("EXPIRED", None):
+                logger.info(f"[THREADS API] Container {container_id} is {status or 'gone'}; creating a new one")
+                container_id = None
+            elif status == "IN_PROGRESS":
+                return {"success": False, "processing": True, "container_id": container_id}
+
+        if media_urls:
+            media_type = "CAROUSEL"
+
+        if container_id is None:
+            # Step 1: Create media container (after its carousel items, if any)
+            try:
+                children = None
+                if media_urls:
+                    children, error = await self._create_carousel_items(media_urls)
+                    if not children:
+                        return {"success": False, "error": error, "status_code": self.last_status_code}
+                container_id, error = await self._create_container(
+                    text, media_url, media_type, children=children, reply_to_id=reply_to_id
+                )
+            except Exception as e:
+                logger.error(f"[THREADS API] Error creating post: {e}")
+                return {"success": False, "error": str(e)}
             
             if not container_id:
-                return {"success": False, "error": error or "Failed to create media container"}
-            
+                return {
+                    "success": False,
+                    "error": error or "Failed to create media container",
+                    "status_code": self.last_status_code,
+                }
+
+            if on_container is not None:
+                await on_container(container_id)
+
+            if media_type != "TEXT":
+                # Media must finish processing server-side before it can be published
+                status, error = await self.get_container_status(container_id)
+                if status == "ERROR":
+                    return {"success": False, "error": f"Media processing failed: {error or 'unknown error'}"}
+                if status != "FINISHED":
+                    return {"success": False, "processing": True, "container_id": container_id}
+        
+        try:
             # Step 2: Publish the container
             post_id, error = await self._publish_container(container_id)
             
             if not post_id:
-                return {"success": False, "error": error or "Failed to publish post"}
+                return {
+                    "success": False,
+                    "error": error or "Failed to publish post",
+                    "status_code": self.last_status_code,
+                }
             
             logger.info(f"[THREADS API] Successfully posted: {post_id}")
             return {"success": True, "post_id": post_id}
@@ -65,12 +166,84 @@ class ThreadsAPIService:
         except Exception as e:
             logger.error(f"[THREADS API] Error creating post: {e}")
             return {"success": False, "error": str(e)}
+
+    @staticmethod
+    def container_poll_delay(polls: int) -> float:
+        """
+        Seconds to wait before checking a processing container again
+        
+        Args:
+            polls: Status checks made so far
+        """
+        return min(CONTAINER_POLL_MAX_SECONDS, CONTAINER_POLL_INITIAL_SECONDS * (2 ** polls))
+
+    async def get_container_status(self, container_id: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Get a media container's lifecycle status
+        
+        Args:
+            container_id: ID from create_container
+        
+        Returns:
+            (Status, Error Message): status is IN_PROGRESS, FINISHED, PUBLISHED,
+            ERROR or EXPIRED; None if it could not be read
+        """
+        endpoint = f"{self.BASE_URL}/{container_id}"
+        
+        params = {
+            "fields": "status,error_message"
+        }
+        
+        try:
+            response = await self.client.get(endpoint, params=params, headers=self.headers)
+            self._observe(response)
+            response.raise_for_status()
+            
+            data = response.json()
+            return data.get("status"), data.get("error_message")
+            
+        except httpx.HTTPStatusError as e:
+            error_details = e.response.text
+            logger.error(f"[THREADS API] HTTP error reading container {container_id}: {e.response.status_code} - {error_details}")
+            return None, f"HTTP {e.response.status_code}: {error_details}"
+        except Exception as e:
+            logger.error(f"[THREADS API] Error reading container {container_id}: {e}")
+            self.last_exception = e
+            return None, str(e)
+    
+    async def _create_carousel_items(self, media_urls: List[str]) -> Tuple[Optional[List[str]], Optional[str]]:
+        """
+        Create the item containers of a carousel, all at once
+        
+        Returns:
+            (Item container IDs in order, Error Message of the first failed item)
+        """
+        async def create_item(url: str):
+            container_id, error = await self._create_container(
+                None, url, self.media_type_for(url), is_carousel_item=True
+            )
+            # Read back before yielding to the loop, so concurrent items can't overwrite it
+            return container_id, error, self.last_status_code, self.last_exception
+        
+        results = await asyncio.gather(*(create_item(url) for url in media_urls))
+        for index, (container_id, error, status_code, exception) in enumerate(results, start=1):
+            if not container_id:
+                # Report the failing item's response, not whichever item finished last
+                self.last_status_code = status_code
+                self.last_exception = exception
+                return None, f"Carousel item {index}: {error or 'Failed to create media container'}"
+        
+        logger.info(f"[THREADS API] Created {len(results)} carousel items")
+        return [container_id for container_id, *_ in results], None
     
     async def _create_container(
         self, 
-        text: str, 
+        text: Optional[str], 
         media_url: Optional[str],
-        media_type: str
+        media_type: str,
+        is_carousel_item: bool = False,
+        children: Optional[List[str]] = None,
+        reply_to_id: Optional[str] = None,
     ) -> Tuple[Optional[str], Optional[str]]:
         """
         Create a media container (Step 1 of posting)
@@ -82,8 +255,16 @@ class ThreadsAPIService:
         
         payload = {
             "media_type": media_type,
-            "text": text
         }
+        # Carousel items carry no text; the caption goes on the parent
+        if is_carousel_item:
+            payload["is_carousel_item"] = True
+        else:
+            payload["text"] = text
+        if children:
+            payload["children"] = ",".join(children)
+        if reply_to_id:
+            payload["reply_to_id"] = reply_to_id
         
         # Add media URL if provided
         if media_url:
@@ -93,7 +274,8 @@ class ThreadsAPIService:
                 payload["video_url"] = media_url
         
         try:
-            response = await self.client.post(endpoint, json=payload)
+            response = await self.client.post(endpoint, json=payload, headers=self.headers)
+            self._observe(response)
             response.raise_for_status()
             
             data = response.json()
@@ -108,6 +290,7 @@ class ThreadsAPIService:
             return None, f"HTTP {e.response.status_code}: {error_details}"
         except Exception as e:
             logger.error(f"[THREADS API] Error creating container: {e}")
+            self.last_exception = e
             return None, str(e)
     
     async def _publish_container(self, container_id: str) -> Tuple[Optional[str], Optional[str]]:
@@ -127,7 +310,8 @@ class ThreadsAPIService:
         }
         
         try:
-            response = await self.client.post(endpoint, json=payload)
+            response = await self.client.post(endpoint, json=payload, headers=self.headers)
+            self._observe(response)
             response.raise_for_status()
             
             data = response.json()
@@ -142,6 +326,7 @@ class ThreadsAPIService:
             return None, f"HTTP {e.response.status_code}: {error_details}"
         except Exception as e:
             logger.error(f"[THREADS API] Error publishing: {e}")
+            self.last_exception = e
             return None, str(e)
     
     async def get_user_profile(self, user_id: str = "me") -> Optional[Dict[str, Any]]:
@@ -162,7 +347,7 @@ class ThreadsAPIService:
         }
         
         try:
-            response = await self.client.get(endpoint, params=params)
+            response = await self.client.get(endpoint, params=params, headers=self.headers)
             response.raise_for_status()
             
             return response.json()
@@ -172,8 +357,9 @@ class ThreadsAPIService:
             return None
     
     async def close(self):
-        """Close the HTTP client"""
-        await self.client.aclose()
+        """Close the HTTP client if this instance created it"""
+        if self._owns_client:
+            await self.client.aclose()
     
     async def __aenter__(self):
         return self
@@ -1,85 +1,196 @@
-from playwright.async_api import async_playwright
 import asyncio
 import random
 import os
-import json
-from pathlib import Path
+import re
+import time
+from contextlib import contextmanager
+from typing import List, NamedTuple, Optional, Tuple
+
+from browser_pool import get_browser_pool
+from session_store import SessionStore, get_session_store
+
+
+class PacingPolicy(NamedTuple):
+    """How human-like the automation behaves; waits for the page itself are always event-driven"""
+    # Think time between UI actions, in seconds (min, max)
+    pause: Tuple[float, float]
+    # Per-keystroke typing delay in ms (min, max); None pastes text in one step
+    keystroke_delay_ms: Optional[Tuple[int, int]]
+
+
+PACING_POLICIES = {
+    "human": PacingPolicy(pause=(0.3, 1.0), keystroke_delay_ms=(30, 90)),
+    "fast": PacingPolicy(pause=(0.0, 0.0), keystroke_delay_ms=None),
+}
+THREADS_AUTOMATION_PACING = os.getenv("THREADS_AUTOMATION_PACING", "human")
+# Longest wait for any single page event (element, navigation, network response)
+THREADS_AUTOMATION_STEP_TIMEOUT_MS = int(os.getenv("THREADS_AUTOMATION_STEP_TIMEOUT_MS", "15000"))
+
+THREADS_URL = 'https://www.threads.net'
+
+# Page markers: a logged-in shell, the login form, the composer and its submit button
+LOGGED_IN_SELECTORS = [
+    'button[aria-label*="Create"]',
+    'button[aria-label*="New"]',
+    'a[href="/"]',  # Home link when logged in
+    'svg[aria-label="Home"]'
+]
+USERNAME_SELECTORS = [
+    'input[name="username"]',
+    'input[type="text"]',
+    'input[placeholder*="username"]',
+    'input[placeholder*="Username"]'
+]
+PASSWORD_SELECTORS = [
+    'input[name="password"]',
+    'input[type="password"]'
+]
+LOGIN_BUTTON_SELECTORS = [
+    'button[type="submit"]',
+    'button:has-text("Log in")',
+    'button:has-text("Log In")',
+    'div[role="button"]:has-text("Log in")'
+]
+COMPOSE_SELECTORS = [
+    'button[aria-label*="Create"]',
+    'button[aria-label*="New"]',
+    'a[href*="new"]',
+    'svg[aria-label*="Create"]'
+]
+# Threads uses contenteditable div
+TEXTAREA_SELECTORS = [
+    '[contenteditable="true"]',
+    'textarea',
+    '[role="textbox"]',
+    'div[data-contents="true"]'
+]
+POST_BUTTON_SELECTORS = [
+    'button:has-text("Post")',
+    'div[role="button"]:has-text("Post")',
+    'button[type="submit"]',
+    'button:has-text("Share")'
+]
+SUCCESS_SELECTORS = [
+    'text="Posted"',
+    'text="Your thread was posted"',
+    '[role="alert"]'
+]
+# The create-post request among the many POSTs the page makes (logging, prefetch, other GraphQL
+# queries): matched against its URL, GraphQL friendly name and body
+CREATE_POST_REQUEST_PATTERN = re.compile(
+    os.getenv(
+        "THREADS_CREATE_POST_REQUEST_PATTERN",
+        r"configure_text_(only_)?post|configure_sidecar|media/configure|create_?(text_?)?post|post_?create",
+    ),
+    re.IGNORECASE,
+)
+
+
+def is_create_post_request(request) -> bool:
+    """True if a Playwright request is the one that publishes the post"""
+    if request.method != "POST":
+        return False
+    try:
+        friendly_name = request.headers.get("x-fb-friendly-name", "")
+        body = request.post_data or ""
+    except Exception:
+        friendly_name, body = "", ""
+    return any(CREATE_POST_REQUEST_PATTERN.search(text) for text in (request.url, friendly_name, body) if text)
+
+
+class StepTrace:
+    """Wall-clock time per automation step, for spotting where a post spends its time"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.started = time.perf_counter()
+        self.steps: List[Tuple[str, float]] = []
+
+    def record(self, name: str, started: float):
+        """Record a step that began at perf_counter() value `started` and just ended"""
+        self.steps.append((name, time.perf_counter() - started))
+
+    @contextmanager
+    def step(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started)
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> str:
+        steps = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.steps)
+        return f"{self.label}: {steps}; total {self.total:.2f}s"
+
 
 class ThreadsAutomation:
-    def __init__(self):
-        self.session_dir = Path("./sessions/threads")
-        self.session_dir.mkdir(parents=True, exist_ok=True)
+    def __init__(self, pacing: Optional[str] = None, sessions: Optional[SessionStore] = None):
+        # Browser sessions live encrypted in ConnectedAccount.session_data
+        self.sessions = sessions or get_session_store()
+        pacing = pacing or THREADS_AUTOMATION_PACING
+        if pacing not in PACING_POLICIES:
+            raise ValueError(f"Unknown pacing policy '{pacing}' (expected one of: {', '.join(PACING_POLICIES)})")
+        self.pacing = PACING_POLICIES[pacing]
+        # Step timings of the most recent post_to_threads call
+        self.last_trace: Optional[StepTrace] = None
     
     async def post_to_threads(self, username: str, password: str, content: str, media_url: str = None):
         """
         Automate posting to Threads using Playwright
+        Runs on a warm, logged-in context from the shared browser pool
         Returns: True if successful, False otherwise
         """
         print(f"[THREADS_AUTO] Starting automation for user: {username}")
+        pool = get_browser_pool()
+        trace = self.last_trace = StepTrace(f"post for {username}")
         
-        async with async_playwright() as p:
-            try:
-                # Launch browser
-                print("[THREADS_AUTO] Launching browser...")
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=[
-                        '--no-sandbox',
-                        '--disable-setuid-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-blink-features=AutomationControlled'
-                    ]
-                )
-                
-                # Load or create context with session
-                context = await self._get_or_create_context(browser, username)
-                page = await context.new_page()
-                
-                # Set viewport
-                await page.set_viewport_size({"width": 1280, "height": 720})
-                
-                # Check if logged in
-                print("[THREADS_AUTO] Checking login status...")
-                is_logged_in = await self._check_login_status(page)
-                
-                if not is_logged_in:
-                    print("[THREADS_AUTO] Not logged in, performing login...")
-                    await self._login(page, username, password)
-                    # Save session
-                    await self._save_session(context, username)
-                    print("[THREADS_AUTO] Login successful, session saved")
-                else:
-                    print("[THREADS_AUTO] Already logged in (using saved session)")
+        try:
+            leasing = time.perf_counter()
+            async with pool.lease(
+                username,
+                storage_state=await self._load_session(username),
+                prepare=lambda entry: self._ensure_logged_in(entry.context, entry.page, username, password),
+                health_check=lambda entry: self._check_login_status(entry.page),
+            ) as entry:
+                trace.record("lease context", leasing)
+                page = entry.page
                 
                 # Navigate to compose
                 print("[THREADS_AUTO] Navigating to compose...")
-                await self._navigate_to_compose(page)
+                with trace.step("open composer"):
+                    await self._navigate_to_compose(page)
                 
                 # Create post
                 print("[THREADS_AUTO] Creating post...")
-                await self._create_post(page, content, media_url)
+                with trace.step("create post"):
+                    confirmed, composer_selector = await self._create_post(page, content, media_url)
                 
                 # Verify success
                 print("[THREADS_AUTO] Verifying post success...")
-                success = await self._verify_post_success(page)
+                with trace.step("verify"):
+                    success = await self._verify_post_success(page, confirmed, composer_selector)
                 
                 if success:
                     print("[THREADS_AUTO] ✓ Post successful!")
+                    # Keep the stored session current if the platform rotated cookies
+                    with trace.step("save session"):
+                        await self._save_session(entry.context, username)
                 else:
                     print("[THREADS_AUTO] ✗ Post verification failed")
                 
-                await browser.close()
                 return success
                 
-            except Exception as e:
-                print(f"[THREADS_AUTO] ✗ Error: {e}")
-                import traceback
-                traceback.print_exc()
-                try:
-                    await browser.close()
-                except:
-                    pass
-                return False
+        except Exception as e:
+            print(f"[THREADS_AUTO] ✗ Error: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+        finally:
+            print(f"[THREADS_AUTO] Timing {trace.summary()}")
     
     async def test_login(self, username: str, password: str) -> bool:
         """
@@ -88,14 +199,9 @@ class ThreadsAutomation:
         """
         print(f"[THREADS_TEST] Testing login for user: {username}")
         
-        async with async_playwright() as p:
-            try:
-                # Launch browser
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=['--no-sandbox', '--disable-setuid-sandbox']
-                )
-                context = await browser.new_context()
+        try:
+            # Fresh context on the shared browser: credentials are verified from scratch
+            async with get_browser_pool().isolated_context() as context:
                 page = await context.new_page()
                 
                 # Perform login
@@ -111,74 +217,95 @@ class ThreadsAutomation:
                 else:
                     print(f"[THREADS_TEST] ✗ Login failed for {username}")
                 
-                await browser.close()
                 return is_logged_in
                 
-            except Exception as e:
-                print(f"[THREADS_TEST] ✗ Error: {e}")
-                import traceback
-                traceback.print_exc()
-                try:
-                    await browser.close()
-                except:
-                    pass
-                return False
+        except Exception as e:
+            print(f"[THREADS_TEST] ✗ Error: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
     
-    async def _get_or_create_context(self, browser, username):
-        """Load saved session or create new context"""
-        session_file = self.session_dir / f"{username}_session.json"
+    async def _ensure_logged_in(self, context, page, username, password):
+        """Log a newly pooled context in, unless its saved session still works"""
+        print("[THREADS_AUTO] Checking login status...")
+        if await self._check_login_status(page):
+            print("[THREADS_AUTO] Already logged in (using saved session)")
+            return
         
-        if session_file.exists():
-            try:
-                # Load saved session
-                with open(session_file, 'r') as f:
-                    session_data = json.load(f)
-                context = await browser.new_context(storage_state=session_data)
-                print(f"[THREADS_AUTO] Loaded saved session for {username}")
-            except Exception as e:
-                print(f"[THREADS_AUTO] Failed to load session: {e}, creating new")
-                context = await browser.new_context()
-        else:
-            print(f"[THREADS_AUTO] No saved session, creating new context")
-            context = await browser.new_context()
-        
-        return context
+        print("[THREADS_AUTO] Not logged in, performing login...")
+        await self._login(page, username, password)
+        if not await self._check_login_status(page):
+            raise Exception(f"Login failed for {username}")
+        # Save session
+        await self._save_session(context, username)
+        print("[THREADS_AUTO] Login successful, session saved")
+    
+    async def _load_session(self, username):
+        """Saved browser session (storage state) for a new context, if there is one"""
+        session_data = await self.sessions.load('threads', username)
+        if session_data is None:
+            print(f"[THREADS_AUTO] No saved session for {username}")
+        return session_data
     
     async def _save_session(self, context, username):
-        """Save browser session for reuse"""
+        """Save browser session for reuse (written only when its cookies changed)"""
         try:
-            session_file = self.session_dir / f"{username}_session.json"
             session_data = await context.storage_state()
-            with open(session_file, 'w') as f:
-                json.dump(session_data, f)
-            print(f"[THREADS_AUTO] Session saved to {session_file}")
+            if await self.sessions.save('threads', username, session_data):
+                print(f"[THREADS_AUTO] Session saved for {username}")
         except Exception as e:
             print(f"[THREADS_AUTO] Failed to save session: {e}")
     
+    async def _pause(self):
+        """Think time between actions, per the pacing policy"""
+        low, high = self.pacing.pause
+        if high > 0:
+            await asyncio.sleep(random.uniform(low, high))
+    
+    async def _enter_text(self, element, text):
+        """Type text key by key (human pacing) or set it in one step (fast pacing)"""
+        await element.click()
+        if self.pacing.keystroke_delay_ms is None:
+            await element.fill(text)
+        else:
+            await element.type(text, delay=random.randint(*self.pacing.keystroke_delay_ms))
+    
+    async def _wait_for_any(self, page, selectors, timeout=None, state="visible"):
+        """
+        Wait for whichever of `selectors` appears first (all are watched at once)
+        Returns: (selector, element), or (None, None) if none appeared in time
+        """
+        timeout = THREADS_AUTOMATION_STEP_TIMEOUT_MS if timeout is None else timeout
+        waits = {
+            asyncio.ensure_future(page.wait_for_selector(selector, state=state, timeout=timeout)): selector
+            for selector in selectors
+        }
+        pending = set(waits)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return waits[task], task.result()
+            return None, None
+        finally:
+            for task in pending:
+                task.cancel()
+    
     async def _check_login_status(self, page):
         """Check if already logged in"""
         try:
-            await page.goto('https://www.threads.net', wait_until='networkidle', timeout=30000)
-            await asyncio.sleep(random.uniform(2, 3))
+            await page.goto(THREADS_URL, wait_until='domcontentloaded', timeout=30000)
             
-            # Check for compose button or new post button (indicates logged in)
-            # Threads uses different selectors, try multiple
-            selectors = [
-                'button[aria-label*="Create"]',
-                'button[aria-label*="New"]',
-                'a[href="/"]',  # Home link when logged in
-                'svg[aria-label="Home"]'
-            ]
-            
-            for selector in selectors:
-                element = await page.query_selector(selector)
-                if element:
-                    print(f"[THREADS_AUTO] Found logged-in indicator: {selector}")
-                    return True
+            # Whichever renders first: the logged-in shell or the login form
+            selector, _ = await self._wait_for_any(page, LOGGED_IN_SELECTORS + USERNAME_SELECTORS[:1])
+            if selector in LOGGED_IN_SELECTORS:
+                print(f"[THREADS_AUTO] Found logged-in indicator: {selector}")
+                return True
             
             # Check URL - if redirected to login, not logged in
             current_url = page.url
-            if 'login' in current_url.lower():
+            if selector is not None or 'login' in current_url.lower():
                 return False
             
             # Default to logged in if we're on threads.net and not redirected
@@ -192,75 +319,38 @@ class ThreadsAutomation:
         """Perform login to Threads"""
         try:
             # Navigate to Threads login
-            await page.goto('https://www.threads.net/login', wait_until='networkidle', timeout=30000)
-            await asyncio.sleep(random.uniform(2, 4))
+            await page.goto(f'{THREADS_URL}/login', wait_until='domcontentloaded', timeout=30000)
             
             # Threads login uses Instagram credentials
-            # Try to find username input
-            username_selectors = [
-                'input[name="username"]',
-                'input[type="text"]',
-                'input[placeholder*="username"]',
-                'input[placeholder*="Username"]'
-            ]
-            
-            username_input = None
-            for selector in username_selectors:
-                username_input = await page.query_selector(selector)
-                if username_input:
-                    break
-            
+            _, username_input = await self._wait_for_any(page, USERNAME_SELECTORS)
             if not username_input:
                 raise Exception("Could not find username input field")
             
-            # Fill username with human-like typing
-            await username_input.click()
-            await asyncio.sleep(random.uniform(0.3, 0.7))
-            await username_input.type(username, delay=random.randint(50, 150))
-            await asyncio.sleep(random.uniform(0.5, 1.5))
-            
-            # Find password input
-            password_selectors = [
-                'input[name="password"]',
-                'input[type="password"]'
-            ]
-            
-            password_input = None
-            for selector in password_selectors:
-                password_input = await page.query_selector(selector)
-                if password_input:
-                    break
+            await self._pause()
+            await self._enter_text(username_input, username)
+            await self._pause()
             
+            _, password_input = await self._wait_for_any(page, PASSWORD_SELECTORS)
             if not password_input:
                 raise Exception("Could not find password input field")
             
-            # Fill password
-            await password_input.click()
-            await asyncio.sleep(random.uniform(0.3, 0.7))
-            await password_input.type(password, delay=random.randint(50, 150))
-            await asyncio.sleep(random.uniform(0.5, 1.5))
+            await self._enter_text(password_input, password)
+            await self._pause()
             
             # Click login button
-            login_button_selectors = [
-                'button[type="submit"]',
-                'button:has-text("Log in")',
-                'button:has-text("Log In")',
-                'div[role="button"]:has-text("Log in")'
-            ]
-            
-            for selector in login_button_selectors:
-                try:
-                    await page.click(selector, timeout=5000)
-                    break
-                except:
-                    continue
+            _, login_button = await self._wait_for_any(page, LOGIN_BUTTON_SELECTORS, timeout=5000)
+            if not login_button:
+                raise Exception("Could not find login button")
+            await login_button.click()
             
-            # Wait for navigation after login
-            await asyncio.sleep(random.uniform(4, 6))
-            
-            # Check if login was successful
-            current_url = page.url
-            if 'login' in current_url.lower():
+            # Wait for navigation away from the login page
+            try:
+                await page.wait_for_url(
+                    lambda url: 'login' not in url.lower(),
+                    wait_until='domcontentloaded',
+                    timeout=THREADS_AUTOMATION_STEP_TIMEOUT_MS,
+                )
+            except Exception:
                 # Still on login page - might be 2FA or error
                 print("[THREADS_AUTO] Warning: Still on login page after submit")
                 # Take screenshot for debugging
@@ -273,59 +363,40 @@ class ThreadsAutomation:
     async def _navigate_to_compose(self, page):
         """Navigate to compose/new post page"""
         try:
-            # Look for compose button
-            compose_selectors = [
-                'button[aria-label*="Create"]',
-                'button[aria-label*="New"]',
-                'a[href*="new"]',
-                'svg[aria-label*="Create"]'
-            ]
+            # A warm context may have been left anywhere; start from the home feed
+            if not page.url.startswith(THREADS_URL):
+                await page.goto(THREADS_URL, wait_until='domcontentloaded', timeout=30000)
             
-            for selector in compose_selectors:
-                try:
-                    element = await page.query_selector(selector)
-                    if element:
-                        await element.click()
-                        await asyncio.sleep(random.uniform(1, 2))
-                        return
-                except:
-                    continue
+            # Look for compose button
+            _, compose_button = await self._wait_for_any(page, COMPOSE_SELECTORS, timeout=5000)
+            if compose_button:
+                await compose_button.click()
+                selector, _ = await self._wait_for_any(page, TEXTAREA_SELECTORS)
+                if selector:
+                    return
             
             # If no compose button found, try navigating directly
-            await page.goto('https://www.threads.net/new', wait_until='networkidle', timeout=30000)
-            await asyncio.sleep(random.uniform(1, 2))
+            await page.goto(f'{THREADS_URL}/new', wait_until='domcontentloaded', timeout=30000)
             
         except Exception as e:
             print(f"[THREADS_AUTO] Error navigating to compose: {e}")
             raise
     
     async def _create_post(self, page, content, media_url):
-        """Create and submit post"""
+        """
+        Create and submit post
+        Returns: (whether the create-post request answered successfully, the composer's textarea selector)
+        """
         try:
             # Find text input area
-            # Threads uses contenteditable div
-            textarea_selectors = [
-                '[contenteditable="true"]',
-                'textarea',
-                '[role="textbox"]',
-                'div[data-contents="true"]'
-            ]
-            
-            textarea = None
-            for selector in textarea_selectors:
-                textarea = await page.query_selector(selector)
-                if textarea:
-                    print(f"[THREADS_AUTO] Found textarea: {selector}")
-                    break
-            
+            textarea_selector, textarea = await self._wait_for_any(page, TEXTAREA_SELECTORS)
             if not textarea:
                 raise Exception("Could not find text input area")
+            print(f"[THREADS_AUTO] Found textarea: {textarea_selector}")
             
-            # Click and type content
-            await textarea.click()
-            await asyncio.sleep(random.uniform(0.5, 1))
-            await textarea.type(content, delay=random.randint(50, 150))
-            await asyncio.sleep(random.uniform(1, 2))
+            await self._pause()
+            await self._enter_text(textarea, content)
+            await self._pause()
             
             # Handle media upload if provided
             if media_url:
@@ -333,62 +404,53 @@ class ThreadsAutomation:
                 # TODO: Implement media upload
             
             # Find and click post button
-            post_button_selectors = [
-                'button:has-text("Post")',
-                'div[role="button"]:has-text("Post")',
-                'button[type="submit"]',
-                'button:has-text("Share")'
-            ]
+            selector, post_button = await self._wait_for_any(page, POST_BUTTON_SELECTORS, timeout=5000)
+            if not post_button:
+                raise Exception("Could not find post button")
             
-            for selector in post_button_selectors:
-                try:
-                    await page.click(selector, timeout=5000)
+            # The post is done when its create-post request answers, not after a fixed delay
+            confirmed = False
+            try:
+                async with page.expect_response(
+                    lambda r: is_create_post_request(r.request),
+                    timeout=THREADS_AUTOMATION_STEP_TIMEOUT_MS,
+                ) as response_info:
+                    await post_button.click()
                     print(f"[THREADS_AUTO] Clicked post button: {selector}")
-                    break
-                except:
-                    continue
-            
-            # Wait for post to complete
-            await asyncio.sleep(random.uniform(3, 5))
+                response = await response_info.value
+                confirmed = response.ok
+                print(f"[THREADS_AUTO] Create-post request answered {response.status}")
+            except Exception:
+                print("[THREADS_AUTO] No create-post response seen; checking the page instead")
+            return confirmed, textarea_selector
             
         except Exception as e:
             print(f"[THREADS_AUTO] Error creating post: {e}")
             raise
     
-    async def _verify_post_success(self, page):
-        """Verify post was successful"""
+    async def _verify_post_success(self, page, confirmed, composer_selector):
+        """
+        Verify post was successful: the create-post request answered OK, or else the
+        composer closed (a modal composer never changes the URL, so the URL proves nothing)
+        """
         try:
-            # Check current URL - successful post usually redirects
-            current_url = page.url
-            
-            # Look for success indicators
-            # - URL changed from /new
-            # - Success message
-            # - Back on home/profile
-            
-            if '/new' not in current_url:
-                print(f"[THREADS_AUTO] URL changed to: {current_url} (likely success)")
+            if confirmed:
                 return True
             
-            # Look for success message or toast
-            success_selectors = [
-                'text="Posted"',
-                'text="Your thread was posted"',
-                '[role="alert"]'
-            ]
-            
-            for selector in success_selectors:
-                element = await page.query_selector(selector)
-                if element:
-                    print(f"[THREADS_AUTO] Found success indicator: {selector}")
-                    return True
-            
-            # If still on compose page, might have failed
-            if '/new' in current_url or 'create' in current_url.lower():
-                print("[THREADS_AUTO] Still on compose page - might have failed")
+            # No matching request seen: the composer closing is the next best signal
+            try:
+                await page.wait_for_selector(
+                    composer_selector, state='hidden', timeout=THREADS_AUTOMATION_STEP_TIMEOUT_MS
+                )
+            except Exception:
+                print("[THREADS_AUTO] Composer still open - post likely failed")
                 return False
             
-            # Default to success if we're not on compose page anymore
+            selector, _ = await self._wait_for_any(page, SUCCESS_SELECTORS, timeout=3000)
+            if selector:
+                print(f"[THREADS_AUTO] Found success indicator: {selector}")
+            else:
+                print("[THREADS_AUTO] Composer closed (likely success)")
             return True
             
         except Exception as e:
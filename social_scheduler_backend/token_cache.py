@@ -0,0 +1,147 @@
+"""
+Access Token Cache
+Keeps decrypted platform tokens in memory so the publish hot path skips the DB read and Fernet decrypt
+"""
+
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+# Upper bound on how long an entry is trusted, so changes made by other
+# workers/replicas (disconnects, new tokens) are picked up eventually
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300"))
+
+
+class CachedToken:
+    """A decrypted access token for one connected account"""
+
+    __slots__ = ("account_id", "platform", "username", "access_token", "expires_at")
+
+    def __init__(self, account_id: int, platform: str, username: str, access_token: str, expires_at: float):
+        self.account_id = account_id
+        self.platform = platform
+        self.username = username
+        self.access_token = access_token
+        self.expires_at = expires_at  # monotonic deadline
+
+
+class TokenCache:
+    """In-memory token cache keyed by account, with expiry-aware eviction"""
+
+    def __init__(self, ttl_seconds: float = TOKEN_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._by_account: Dict[int, CachedToken] = {}
+        # platform -> (active account id or None when there is none, monotonic deadline)
+        self._active: Dict[str, Tuple[Optional[int], float]] = {}
+        # account id -> last publish time, flushed to ConnectedAccount.last_used_at in batches
+        self._last_used: Dict[int, datetime] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _deadline(self, token_expires_at: Optional[datetime]) -> float:
+        deadline = time.monotonic() + self.ttl_seconds
+        if token_expires_at is not None:
+            if token_expires_at.tzinfo is None:
+                token_expires_at = token_expires_at.replace(tzinfo=timezone.utc)
+            remaining = (token_expires_at - datetime.now(timezone.utc)).total_seconds()
+            deadline = min(deadline, time.monotonic() + remaining)
+        return deadline
+
+    def get(self, account_id: int) -> Optional[CachedToken]:
+        """Cached token for an account, or None (evicting it if expired)"""
+        entry = self._by_account.get(account_id)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self.invalidate_account(account_id)
+            entry = None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def lookup_active(self, platform: str) -> Tuple[bool, Optional[CachedToken]]:
+        """
+        Resolve the active account for a platform from cache
+
+        Returns:
+            (known, token): known is False when the DB must be consulted;
+            known with token None means "no connected account" was cached
+        """
+        active = self._active.get(platform)
+        if active is None or active[1] <= time.monotonic():
+            self._active.pop(platform, None)
+            self.misses += 1
+            return False, None
+        account_id = active[0]
+        if account_id is None:
+            self.hits += 1
+            return True, None
+        entry = self.get(account_id)
+        return entry is not None, entry
+
+    def put(
+        self,
+        platform: str,
+        account_id: Optional[int],
+        username: Optional[str] = None,
+        access_token: Optional[str] = None,
+        token_expires_at: Optional[datetime] = None,
+        active: bool = True,
+    ) -> Optional[CachedToken]:
+        """
+        Cache an account's token (account_id None records that the platform has no account)
+
+        With `active` it also becomes the platform's default account, used
+        for posts that don't name one.
+        """
+        if account_id is None:
+            self._active[platform] = (None, time.monotonic() + self.ttl_seconds)
+            return None
+        deadline = self._deadline(token_expires_at)
+        if deadline <= time.monotonic():
+            # Already expired: never cache, let every publish re-read the DB
+            return None
+        entry = CachedToken(account_id, platform, username, access_token, deadline)
+        self._by_account[account_id] = entry
+        if active:
+            self._active[platform] = (account_id, deadline)
+        return entry
+
+    def invalidate_account(self, account_id: Optional[int]):
+        """Drop one account's token (disconnect, token refresh)"""
+        entry = self._by_account.pop(account_id, None)
+        if entry is not None:
+            active = self._active.get(entry.platform)
+            if active is not None and active[0] == account_id:
+                del self._active[entry.platform]
+
+    def invalidate_platform(self, platform: str):
+        """Drop every cached token for a platform"""
+        self._active.pop(platform, None)
+        for account_id in [a for a, e in self._by_account.items() if e.platform == platform]:
+            del self._by_account[account_id]
+
+    def mark_used(self, account_id: int):
+        """Record a publish; persisted later by drain_last_used()"""
+        self._last_used[account_id] = datetime.now(timezone.utc)
+
+    def drain_last_used(self) -> Dict[int, datetime]:
+        """Take the pending last_used_at updates"""
+        pending, self._last_used = self._last_used, {}
+        return pending
+
+    def clear(self):
+        self._by_account.clear()
+        self._active.clear()
+
+
+# Global instance
+_token_cache = None
+
+def get_token_cache() -> TokenCache:
+    """Get or create the global token cache"""
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = TokenCache()
+    return _token_cache
@@ -1,5 +1,5 @@
 import { useState, useEffect, useRef } from 'react';
-import { getPosts, createPost, deletePost } from './api';
+import { getAllPosts, getPostChanges, createPost, deletePost, subscribePostEvents } from './api';
 import { Linkedin, Facebook, Twitter, AtSign, Search, Bell } from 'lucide-react';
 import { Toaster, toast } from 'react-hot-toast';
 import Sidebar from './components/Sidebar';
@@ -25,19 +25,30 @@ function App() {
   const [postImmediately, setPostImmediately] = useState(false); // Lifted state
   const [searchQuery, setSearchQuery] = useState('');
   const prevPostsRef = useRef([]);
+  const syncCursorRef = useRef(null);
 
   // Load Posts & Init Dark Mode
   useEffect(() => {
     fetchPosts();
-    // Auto-refresh stats every 10 seconds (Mock Real-Time)
+    // Server pushes post changes; each one triggers a cheap delta sync.
+    // A slow poll stays as a safety net for changes made by other server workers.
+    let pending = null;
+    const unsubscribe = subscribePostEvents(() => {
+      clearTimeout(pending);
+      pending = setTimeout(fetchPosts, 200);
+    });
     const interval = setInterval(() => {
       fetchPosts();
-    }, 10000);
+    }, 60000);
 
     if (darkMode) {
       document.documentElement.classList.add('dark');
     }
-    return () => clearInterval(interval);
+    return () => {
+      clearInterval(interval);
+      clearTimeout(pending);
+      unsubscribe();
+    };
   }, []);
 
   useEffect(() => {
@@ -48,9 +59,27 @@ function App() {
     }
   }, [darkMode]);
 
+  // First call loads everything; later polls only apply what changed since the last sync
+  const loadPosts = async () => {
+    if (syncCursorRef.current) {
+      const changes = await getPostChanges(syncCursorRef.current);
+      if (!changes.reset) {
+        syncCursorRef.current = changes.cursor;
+        const gone = new Set(changes.deleted);
+        const byId = new Map(prevPostsRef.current.filter(p => !gone.has(p.id)).map(p => [p.id, p]));
+        changes.posts.forEach(p => byId.set(p.id, { ...byId.get(p.id), ...p }));
+        return [...byId.values()].sort((a, b) =>
+          new Date(a.scheduled_at) - new Date(b.scheduled_at) || a.id - b.id);
+      }
+    }
+    const { posts, syncCursor } = await getAllPosts();
+    syncCursorRef.current = syncCursor;
+    return posts;
+  };
+
   const fetchPosts = async () => {
     try {
-      const data = await getPosts();
+      const data = await loadPosts();
 
       // Check for status changes to trigger notifications
       const prevPosts = prevPostsRef.current;
@@ -151,6 +180,7 @@ function App() {
     switch (status) {
       case 'published': return 'bg-emerald-100 dark:bg-emerald-500/20 text-emerald-800 dark:text-emerald-300 border border-emerald-200 dark:border-emerald-500/30';
       case 'failed': return 'bg-rose-100 dark:bg-rose-500/20 text-rose-800 dark:text-rose-300 border border-rose-200 dark:border-rose-500/30';
+      case 'dead_letter': return 'bg-amber-100 dark:bg-amber-500/20 text-amber-800 dark:text-amber-300 border border-amber-200 dark:border-amber-500/30';
       case 'pending': return 'bg-sky-100 dark:bg-sky-500/20 text-sky-800 dark:text-sky-300 border border-sky-200 dark:border-sky-500/30';
       default: return 'bg-slate-100 dark:bg-slate-700/50 text-slate-800 dark:text-slate-300 border border-slate-200 dark:border-slate-600';
     }
@@ -5,9 +5,46 @@ const api = axios.create({
     baseURL: import.meta.env.VITE_API_URL || '/api',
 });
 
-export const getPosts = async () => {
-    const response = await api.get('/posts');
-    return response.data;
+// Fetch one page of posts; the next page's cursor comes back in X-Next-Cursor
+export const getPostsPage = async (params = {}) => {
+    const response = await api.get('/posts', { params });
+    return {
+        posts: response.data,
+        nextCursor: response.headers['x-next-cursor'] || null,
+        syncCursor: response.headers['x-sync-cursor'] || null,
+    };
+};
+
+// Full listing plus the sync cursor to pass to getPostChanges()
+export const getAllPosts = async (params = {}) => {
+    const posts = [];
+    let cursor = null;
+    let syncCursor = null;
+    do {
+        const page = await getPostsPage({ limit: 500, ...params, ...(cursor ? { cursor } : {}) });
+        posts.push(...page.posts);
+        syncCursor = syncCursor || page.syncCursor;
+        cursor = page.nextCursor;
+    } while (cursor);
+    return { posts, syncCursor };
+};
+
+export const getPosts = async (params = {}) => (await getAllPosts(params)).posts;
+
+// Changes since a sync cursor: { posts, deleted, cursor, reset }
+export const getPostChanges = async (since) => {
+    const posts = [];
+    const deleted = [];
+    let cursor = since;
+    let data;
+    do {
+        const response = await api.get('/posts', { params: { since: cursor, limit: 500 } });
+        data = response.data;
+        posts.push(...data.posts);
+        deleted.push(...data.deleted);
+        cursor = data.cursor;
+    } while (data.has_more && !data.reset);
+    return { posts, deleted, cursor, reset: !!data.reset };
 };
 
 export const createPost = async (postData) => {
@@ -19,3 +56,12 @@ export const deletePost = async (id) => {
     const response = await api.delete(`/posts/${id}`);
     return response.data;
 };
+
+// Server-Sent Events stream of post changes
+export const subscribePostEvents = (onChange) => {
+    const base = (api.defaults.baseURL || '').replace(/\/$/, '');
+    const source = new EventSource(`${base}/posts/events`);
+    ['post.created', 'post.updated', 'post.deleted', 'posts.imported', 'reset'].forEach(type =>
+        source.addEventListener(type, (event) => onChange(type, JSON.parse(event.data || '{}'))));
+    return () => source.close();
+};
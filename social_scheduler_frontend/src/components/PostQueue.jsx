@@ -8,7 +8,7 @@ const PostQueue = ({ posts, handleDelete, getStatusBadge, platforms }) => {
     // Filter Logic
     const displayedPosts = posts.filter(post => {
         if (viewMode === 'upcoming') {
-            return post.status === 'pending' || post.status === 'failed';
+            return post.status === 'pending' || post.status === 'failed' || post.status === 'dead_letter';
         } else {
             return post.status === 'published';
         }
@@ -76,7 +76,8 @@ const PostQueue = ({ posts, handleDelete, getStatusBadge, platforms }) => {
                                 >
                                     {/* Status Indicator Bar */}
                                     <div className={`absolute left-0 top-0 bottom-0 w-1 ${post.status === 'published' ? 'bg-emerald-500' :
-                                            post.status === 'failed' ? 'bg-rose-500' : 'bg-sky-500'
+                                            post.status === 'failed' ? 'bg-rose-500' :
+                                            post.status === 'dead_letter' ? 'bg-amber-500' : 'bg-sky-500'
                                         }`}></div>
 
                                     <div className="flex justify-between items-start mb-2 pl-2">
@@ -90,9 +91,9 @@ const PostQueue = ({ posts, handleDelete, getStatusBadge, platforms }) => {
                                         </div>
                                         <span className={`px-2 py-0.5 rounded text-[10px] font-bold uppercase tracking-wide flex items-center gap-1.5 ${getStatusBadge(post.status)}`}>
                                             {post.status === 'published' && <CheckCircle className="h-3 w-3" />}
-                                            {post.status === 'failed' && <AlertOctagon className="h-3 w-3" />}
+                                            {(post.status === 'failed' || post.status === 'dead_letter') && <AlertOctagon className="h-3 w-3" />}
                                             {post.status === 'pending' && <Clock className="h-3 w-3" />}
-                                            {post.status}
+                                            {post.status.replace('_', ' ')}
                                         </span>
                                     </div>
 
@@ -101,6 +102,18 @@ const PostQueue = ({ posts, handleDelete, getStatusBadge, platforms }) => {
                                             {post.content}
                                         </p>
 
+                                        {(post.status === 'failed' || post.status === 'dead_letter') && post.error_message && (
+                                            <p className="text-xs text-rose-500 mb-3 line-clamp-2" title={post.error_message}>
+                                                {post.error_message}
+                                            </p>
+                                        )}
+
+                                        {post.status === 'pending' && post.next_attempt_at && (
+                                            <p className="text-xs text-amber-500 mb-3 line-clamp-2" title={post.error_message}>
+                                                Retry {post.attempt_count + 1} at {new Date(post.next_attempt_at).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })}
+                                            </p>
+                                        )}
+
                                         <div className="flex justify-between items-center pt-2 border-t border-slate-100 dark:border-slate-700/50">
                                             <span className="text-xs text-slate-400 font-medium flex items-center gap-1">
                                                 {new Date(post.scheduled_at).toLocaleString([], {